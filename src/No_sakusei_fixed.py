@@ -3,6 +3,8 @@ from tkinter import ttk, messagebox, filedialog
 import os
 import pandas as pd
 import csv
+from atomic_writer import write_dataframe
+from read_cache import read_table
 
 
 class Company:
@@ -112,7 +114,7 @@ class InputUI:
     def load_company_data_from_csv(self):
         try:
             if os.path.exists(self.company_db_file_path):
-                self.df_company_db = pd.read_csv(self.company_db_file_path)
+                self.df_company_db = read_table(self.company_db_file_path, encoding="utf-8-sig")
                 self.company_names = self.df_company_db["企業名"].unique(
                 ).tolist()
                 self.name_dropdown['values'] = self.company_names
@@ -167,15 +169,14 @@ class InputUI:
 
         if company_name in self.df_company_db["企業名"].values:
             try:
-                df = pd.read_csv(self.company_db_file_path)
+                df = read_table(self.company_db_file_path, encoding="utf-8-sig")
                 company_index = df[df["企業名"] == company_name].index[0]
                 df.loc[company_index,
                        "識別アルファベット"] = alphabet
                 df.loc[company_index, "番号生成タイプ"] = format_type
                 df.loc[company_index, "派生タイプ"] = derivation_type
                 df.loc[company_index, "派生数"] = derivation_count
-                df.to_csv(self.company_db_file_path,
-                          index=False, encoding="utf-8-sig")
+                write_dataframe(df, self.company_db_file_path, encoding="utf-8-sig")
                 messagebox.showinfo("更新完了", f"企業情報が更新されました。")
             except Exception as e:
                 messagebox.showerror(
@@ -191,8 +192,7 @@ class InputUI:
                                     columns=["企業名", "識別アルファベット", "番号生成タイプ", "派生タイプ", "派生数"])
             self.df_company_db = pd.concat(
                 [self.df_company_db, new_row], ignore_index=True)
-            self.df_company_db.to_csv(self.company_db_file_path,
-                                     index=False, encoding="utf-8-sig")
+            write_dataframe(self.df_company_db, self.company_db_file_path, encoding="utf-8-sig")
 
 
 # メイン処理
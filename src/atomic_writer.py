@@ -0,0 +1,183 @@
+# === このファイルの責務（GPT用構造補助） ===
+# atomic_writer.py：
+# CSV などの保存を「一時ファイル → fsync → アトミックな置き換え」で行う共通書き込み層
+# 置き換えと追記の瞬間だけ助言ロック（<ファイル名>.lock）を取り、待ち時間を記録する
+# 一時ファイルへの書き出し自体はロックの外で行うため、保存同士が長く直列化されない
+# 読み込み→マージ→書き込みを行う保存処理は、その全体を file_lock で囲む（同じスレッドでの入れ子は可）
+
+import os
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_SUFFIX = ".lock"
+
+# ロック待ちの計測値（get_lock_metrics で参照する）
+_metrics = {"acquired": 0, "total_wait_sec": 0.0, "max_wait_sec": 0.0, "by_path": {}}
+_metrics_lock = threading.Lock()
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_held = threading.local()  # このスレッドが保持中のロック（絶対パス -> 入れ子の深さ）
+
+
+def _thread_lock_for(path):
+    key = os.path.abspath(path)
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(key, threading.Lock())
+
+
+def _record_wait(path, waited):
+    with _metrics_lock:
+        _metrics["acquired"] += 1
+        _metrics["total_wait_sec"] += waited
+        _metrics["max_wait_sec"] = max(_metrics["max_wait_sec"], waited)
+        entry = _metrics["by_path"].setdefault(os.path.basename(path), {"acquired": 0, "total_wait_sec": 0.0, "max_wait_sec": 0.0})
+        entry["acquired"] += 1
+        entry["total_wait_sec"] += waited
+        entry["max_wait_sec"] = max(entry["max_wait_sec"], waited)
+
+
+def get_lock_metrics():
+    """ロック取得回数・待ち時間の集計を返す"""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+        metrics["by_path"] = {path: dict(entry) for path, entry in _metrics["by_path"].items()}
+        return metrics
+
+
+def _os_lock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.01)
+
+
+def _os_unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path):
+    """path に対する助言ロック（プロセス間・スレッド間の両方で排他）
+
+    同じスレッドが既に保持している場合はそのまま通す（atomic_write などを内側で呼べる）。
+    """
+    key = os.path.abspath(path)
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = {}
+    if held.get(key):
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    start = time.perf_counter()
+    thread_lock = _thread_lock_for(path)
+    thread_lock.acquire()
+    try:
+        fd = os.open(path + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _os_lock(fd)
+            _record_wait(path, time.perf_counter() - start)
+            held[key] = 1
+            try:
+                yield
+            finally:
+                held.pop(key, None)
+                _os_unlock(fd)
+        finally:
+            os.close(fd)
+    finally:
+        thread_lock.release()
+
+
+def _fsync_dir(dir_path):
+    if fcntl is None:
+        return  # Windows ではディレクトリの fsync はできない
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_after_write_hooks = []
+
+
+def register_after_write(hook):
+    """書き込み完了後に hook(path) を呼ぶよう登録する（読み込みキャッシュの無効化など）"""
+    if hook not in _after_write_hooks:
+        _after_write_hooks.append(hook)
+
+
+def _run_after_write(path):
+    for hook in list(_after_write_hooks):
+        try:
+            hook(path)
+        except Exception as e:
+            print(f"[atomic_writer] 書き込み後処理エラー: {e}")
+
+
+@contextmanager
+def atomic_write(path, mode="w", encoding="utf-8-sig", newline=""):
+    """一時ファイルに書き、fsync 後にロックを取って path と置き換える"""
+    dir_path = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=dir_path)
+    try:
+        # mkstemp は 0600 で作るため、既存ファイルの権限を引き継ぐ
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        if "b" in mode:
+            f = os.fdopen(fd, mode)
+        else:
+            f = os.fdopen(fd, mode, encoding=encoding, newline=newline)
+        with f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        with file_lock(path):
+            os.replace(tmp_path, path)
+        _fsync_dir(dir_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _run_after_write(path)
+
+
+@contextmanager
+def locked_append(path, encoding="utf-8-sig", newline=""):
+    """ロックを取って追記し、fsync してから解放する"""
+    with file_lock(path):
+        with open(path, "a", encoding=encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+    _run_after_write(path)
+
+
+def write_dataframe(df, path, encoding="utf-8-sig", **to_csv_kwargs):
+    """DataFrame を CSV としてアトミックに保存する"""
+    to_csv_kwargs.setdefault("index", False)
+    with atomic_write(path, encoding=encoding) as f:
+        df.to_csv(f, **to_csv_kwargs)
@@ -0,0 +1,117 @@
+# === このファイルの責務（GPT用構造補助） ===
+# batch_mapping.py：
+# data/ 内の企業db（{企業名}_db.csv）をプロセスプールで並列にマッピングし、
+# 親プロセスで 1 回だけ circus_db.csv に upsert するバッチ処理
+# 各ワーカーは描画済みの行（DataFrame）を返すだけで、保存は行わない
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+from read_cache import read_table
+from rule_index import PrefixRuleIndex
+from mapping_rule_repository import get_repository, rule_body
+from mapping_engine import MappingError, apply_rule_frame, validate_rule
+from data_saver import save_circus_db
+
+DATA_DIR = "data"
+COMPANY_FILE_SUFFIX = "_db.csv"
+MAPPING_FILE = "circus_db_mapping.csv"
+CIRCUS_DB_FILE = "circus_db.csv"
+
+
+def company_name_from_path(company_db_path):
+    """data/{企業名}_db.csv から企業名を取り出す"""
+    name = os.path.basename(company_db_path)
+    return name[:-len(COMPANY_FILE_SUFFIX)] if name.endswith(COMPANY_FILE_SUFFIX) else os.path.splitext(name)[0]
+
+
+def list_company_files(data_dir=DATA_DIR, company_names=None):
+    """data/ 内の企業dbのパスを返す（company_names 指定時はその企業のみ）"""
+    if company_names:
+        return [os.path.join(data_dir, f"{name}{COMPANY_FILE_SUFFIX}") for name in company_names]
+    if not os.path.isdir(data_dir):
+        return []
+    return sorted(
+        os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(COMPANY_FILE_SUFFIX)
+    )
+
+
+def map_company_frame(df_company, company_name, rules):
+    """企業dbの全行に前方一致するルールを適用し、circus_db の行として返す"""
+    rule_index = PrefixRuleIndex(rules)
+    rule_orders = rule_index.assign(company_name, df_company["管理番号"])
+    # 前方一致しない行は execute_mapping と同じく「管理番号に含まれる」ルールを先勝ちで当てる
+    numbers = df_company["管理番号"].astype(str)
+    unmatched = rule_orders < 0
+    for order, rule in enumerate(rules):
+        if not unmatched.any():
+            break
+        prefix = rule.get("管理番号の文字列") or ""
+        if prefix:
+            hit = unmatched & numbers.str.contains(prefix, regex=False).to_numpy()
+            rule_orders[hit] = order
+            unmatched &= ~hit
+    frames = []
+    for order in pd.unique(rule_orders[rule_orders >= 0]):
+        body = rule_body(rules[order])
+        validate_rule(body, df_company.columns)
+        target = df_company[rule_orders == order]
+        rendered = apply_rule_frame(target, body)
+        rendered["企業名"] = company_name
+        rendered["管理番号"] = target["管理番号"].to_numpy(dtype=object)
+        frames.append(rendered)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames).sort_index().reset_index(drop=True)
+
+
+def map_company_file(company_db_path, mapping_path=MAPPING_FILE):
+    """ワーカー処理：1 社分をマッピングして (企業名, DataFrame, エラー文字列) を返す"""
+    company_name = company_name_from_path(company_db_path)
+    try:
+        df_company = read_table(company_db_path, copy=False, encoding="utf-8-sig")
+        rules = get_repository(mapping_path).company_rules(company_name)
+        return company_name, map_company_frame(df_company, company_name, rules), None
+    except (MappingError, FileNotFoundError, ValueError, KeyError) as e:
+        return company_name, None, str(e)
+
+
+def run_batch(data_dir=DATA_DIR, mapping_path=MAPPING_FILE, circus_db_path=CIRCUS_DB_FILE,
+              company_names=None, max_workers=None, save=True, progress=print):
+    """企業dbをまとめてマッピングし、結果を 1 回で circus_db に upsert する
+
+    戻り値は {"mapped": {企業名: 行数}, "errors": {企業名: エラー}, "counts": upsert 件数,
+    "rows": 描画した全行（無ければ None）, "elapsed_sec": 秒}
+    """
+    start = time.perf_counter()
+    files = list_company_files(data_dir, company_names)
+    mapped, errors, frames = {}, {}, []
+
+    def collect(company_name, frame, error):
+        if error is not None:
+            errors[company_name] = error
+            progress(f"[batch] {company_name}: エラー {error}")
+            return
+        mapped[company_name] = len(frame)
+        if len(frame):
+            frames.append(frame)
+        progress(f"[batch] {company_name}: {len(frame)} 件 ({len(mapped) + len(errors)}/{len(files)})")
+
+    if max_workers == 1 or len(files) <= 1:
+        for path in files:
+            collect(*map_company_file(path, mapping_path))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(map_company_file, path, mapping_path) for path in files]
+            for future in as_completed(futures):
+                collect(*future.result())
+
+    rows = pd.concat(frames, ignore_index=True) if frames else None
+    counts = None
+    if save and rows is not None:
+        counts = save_circus_db(rows, circus_db_path)
+    elapsed = time.perf_counter() - start
+    progress(f"[batch] 完了: {len(mapped)} 社 / エラー {len(errors)} 社 / {elapsed:.2f} 秒")
+    return {"mapped": mapped, "errors": errors, "counts": counts, "rows": rows, "elapsed_sec": elapsed}
@@ -0,0 +1,97 @@
+# === このファイルの責務（GPT用構造補助） ===
+# binary_snapshot.py：
+# CSV の横に置く列指向バイナリ（Feather / Arrow IPC）のサイドカーを扱う
+# サイドカーには「元 CSV の (mtime_ns, size)」と「read_csv のオプション」を記録し、
+# 両方が一致するときだけメモリマップで読み込む（一致しなければ CSV を読む）
+# サイドカーを書くのは保存処理（write_sidecar）だけで、読み込みでは作らない
+# pyarrow が無い環境では何もせず、常に CSV を読む
+
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+from atomic_writer import atomic_write
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# サイドカーを使えなかったときの状況は logging で出す（CSV を読むだけなので処理は続く）
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = ".feather"
+METADATA_KEY = b"circus_sidecar"
+# 環境変数 CIRCUS_BINARY_SNAPSHOT=0 で無効化できる
+ENABLED = feather is not None and os.environ.get("CIRCUS_BINARY_SNAPSHOT", "1") != "0"
+
+
+def sidecar_path(csv_path):
+    return csv_path + SIDECAR_SUFFIX
+
+
+def _csv_signature(csv_path):
+    st = os.stat(csv_path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _options_token(opts):
+    """read_csv のオプションを比較用の文字列にする（dtype=str なども名前で表す）"""
+    return json.dumps(opts, sort_keys=True, ensure_ascii=False,
+                      default=lambda v: getattr(v, "__name__", repr(v)))
+
+
+def write_sidecar(df, csv_path, opts=None):
+    """df を csv_path のサイドカーとして書く。書けた場合 True を返す"""
+    if not ENABLED:
+        return False
+    try:
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[METADATA_KEY] = json.dumps({
+            "csv_signature": _csv_signature(csv_path),
+            "opts": _options_token(opts or {}),
+        }).encode("utf-8")
+        table = table.replace_schema_metadata(meta)
+        with atomic_write(sidecar_path(csv_path), mode="wb") as f:
+            feather.write_feather(table, f, compression="uncompressed")
+        return True
+    except Exception as e:
+        # 型が混在した列などは Arrow に変換できないため、CSV のみで運用する
+        logger.info("サイドカーを作成できませんでした (%s): %s", os.path.basename(csv_path), e)
+        return False
+
+
+def read_sidecar(csv_path, opts=None):
+    """有効なサイドカーがあればメモリマップで読み込んで返す。無ければ None"""
+    if not ENABLED:
+        return None
+    path = sidecar_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+        meta = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+        if meta.get("csv_signature") != _csv_signature(csv_path) or meta.get("opts") != _options_token(opts or {}):
+            return None
+        df = table.to_pandas()
+    except Exception as e:
+        logger.info("サイドカーの読み込みに失敗しました (%s): %s", os.path.basename(path), e)
+        return None
+    # Arrow の null は object 列では None になるため、read_csv と同じ NaN に戻す
+    for col in df.columns[df.dtypes == object]:
+        if df[col].isna().any():
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def read_csv_with_sidecar(csv_path, **opts):
+    """サイドカーが有効ならそれを、無効なら CSV を読んで返す（サイドカーは作らない）"""
+    df = read_sidecar(csv_path, opts)
+    if df is not None:
+        return df
+    return pd.read_csv(csv_path, **opts)
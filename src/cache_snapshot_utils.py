@@ -1,38 +1,329 @@
 # === cache_snapshot_utils.py ===
 # Step C: スナップショット監視処理 + Step D: CSV → キャッシュ復元処理
 import os
+import re
 import glob
+import time
+from datetime import datetime
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
 
+from binary_snapshot import SIDECAR_SUFFIX, read_csv_with_sidecar
+
+SNAPSHOT_KEY_COLUMN = "No."
+# 差分監視で一度に読み込む行数（メモリ使用量は行の内容ではなくキーの数に比例させる）
+DIFF_CHUNK_SIZE = 50000
+
+
+class SnapshotDiff:
+    """2 つのスナップショットを No. で突き合わせた結果"""
+
+    def __init__(self, previous, latest):
+        self.previous = previous
+        self.latest = latest
+        self.previous_rows = 0
+        self.latest_rows = 0
+        self.added = []            # 最新にだけある No.
+        self.removed = []          # 前回にだけある No.
+        self.changed = []          # 内容が変わった No.
+        self.changed_columns = {}  # 列名 -> 変わった行数
+        self.row_changes = {}      # No. -> 変わった列名のリスト
+        self.added_columns = []
+        self.removed_columns = []
+
+    @property
+    def identical(self):
+        return not (self.added or self.removed or self.changed or self.added_columns or self.removed_columns)
+
+    def summary_lines(self, max_keys=10):
+        if self.identical:
+            return ["[monitor] 差分なし（スナップショット内容は同一です）"]
+        lines = [
+            "[monitor] 差分検出：最新スナップショットと前回に違いがあります",
+            f"前回: {self.previous}, 現在: {self.latest}",
+            f"前回行数: {self.previous_rows}, 現在行数: {self.latest_rows}",
+            f"追加 {len(self.added)} 件 / 削除 {len(self.removed)} 件 / 変更 {len(self.changed)} 件",
+        ]
+        for label, keys in (("追加", self.added), ("削除", self.removed)):
+            if keys:
+                lines.append(f"{label}された No.: {', '.join(keys[:max_keys])}" + (" ..." if len(keys) > max_keys else ""))
+        for key in self.changed[:max_keys]:
+            lines.append(f"変更 No.{key}: {', '.join(self.row_changes.get(key, []))}")
+        if self.changed_columns:
+            lines.append("変更された列: " + "、".join(f"{col}({count})" for col, count in self.changed_columns.items()))
+        if self.added_columns or self.removed_columns:
+            lines.append(f"列の追加: {self.added_columns} / 列の削除: {self.removed_columns}")
+        return lines
+
+
+def _read_header(path):
+    return list(pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns)
+
+
+def _iter_chunks(path, columns, chunksize=DIFF_CHUNK_SIZE):
+    """スナップショットを少しずつ読み、(キー, 列をそろえたチャンク) を返す"""
+    offset = 0
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig", chunksize=chunksize):
+        if SNAPSHOT_KEY_COLUMN in chunk.columns:
+            keys = chunk[SNAPSHOT_KEY_COLUMN].str.strip()
+        else:
+            keys = pd.Series([f"auto_{i}" for i in range(offset, offset + len(chunk))], index=chunk.index)
+        offset += len(chunk)
+        yield keys.to_numpy(dtype=object), chunk.reindex(columns=columns, fill_value="")
+
+
+def _row_hashes(path, columns):
+    """No. -> 行ハッシュ（同じ No. が複数ある場合は後の行）と行数を返す"""
+    hashes = {}
+    rows = 0
+    for keys, chunk in _iter_chunks(path, columns):
+        rows += len(chunk)
+        hashes.update(zip(keys, pd.util.hash_pandas_object(chunk, index=False).to_numpy()))
+    return hashes, rows
+
+
+def _column_hashes(path, columns, wanted):
+    """wanted に含まれる No. についてだけ、列ごとのハッシュを返す"""
+    result = {}
+    for keys, chunk in _iter_chunks(path, columns):
+        mask = pd.Series(keys).isin(wanted).to_numpy()
+        if not mask.any():
+            continue
+        selected = chunk[mask]
+        per_column = {col: pd.util.hash_pandas_object(selected[col], index=False).to_numpy() for col in columns}
+        for i, key in enumerate(keys[mask]):
+            result[key] = [per_column[col][i] for col in columns]
+    return result
+
+
+def diff_snapshots(previous, latest):
+    """2 つのスナップショットを No. ごとの行ハッシュで比較した SnapshotDiff を返す"""
+    diff = SnapshotDiff(previous, latest)
+    previous_columns, latest_columns = _read_header(previous), _read_header(latest)
+    diff.added_columns = [col for col in latest_columns if col not in previous_columns]
+    diff.removed_columns = [col for col in previous_columns if col not in latest_columns]
+    # 列の並び順の違いは差分とみなさない
+    columns = sorted(set(previous_columns) | set(latest_columns))
+
+    old_hashes, diff.previous_rows = _row_hashes(previous, columns)
+    new_hashes, diff.latest_rows = _row_hashes(latest, columns)
+    diff.added = [key for key in new_hashes if key not in old_hashes]
+    diff.removed = [key for key in old_hashes if key not in new_hashes]
+    diff.changed = [key for key, value in new_hashes.items() if key in old_hashes and old_hashes[key] != value]
+    if not diff.changed:
+        return diff
+
+    # 変わった行だけをもう一度読み、どの列が変わったかを調べる
+    wanted = set(diff.changed)
+    old_columns = _column_hashes(previous, columns, wanted)
+    new_columns = _column_hashes(latest, columns, wanted)
+    counts = {}
+    for key in diff.changed:
+        changed = [col for col, old, new in zip(columns, old_columns[key], new_columns[key]) if old != new]
+        diff.row_changes[key] = changed
+        for col in changed:
+            counts[col] = counts.get(col, 0) + 1
+    diff.changed_columns = dict(sorted(counts.items(), key=lambda item: -item[1]))
+    return diff
+
+
+def diff_store_snapshots(previous, latest, cache_dir="cache"):
+    """差分スナップショット（snapshot_store のマニフェスト）同士を比較した SnapshotDiff を返す
+
+    行の比較はマニフェストの行ハッシュだけで行い、内容が変わった行だけをパックから読む。
+    """
+    import snapshot_store
+
+    diff = SnapshotDiff(previous, latest)
+    old, new = snapshot_store.load_manifest(previous, cache_dir), snapshot_store.load_manifest(latest, cache_dir)
+    diff.added_columns = [col for col in new["columns"] if col not in old["columns"]]
+    diff.removed_columns = [col for col in old["columns"] if col not in new["columns"]]
+    old_hashes = {key: row_hash for key, row_hash, _ in old["rows"]}
+    new_hashes = {key: row_hash for key, row_hash, _ in new["rows"]}
+    diff.previous_rows, diff.latest_rows = len(old["rows"]), len(new["rows"])
+    diff.added = [key for key in new_hashes if key not in old_hashes]
+    diff.removed = [key for key in old_hashes if key not in new_hashes]
+    diff.changed = [key for key, value in new_hashes.items() if key in old_hashes and old_hashes[key] != value]
+    if not diff.changed:
+        return diff
+
+    old_rows = snapshot_store.load_rows(previous, diff.changed, cache_dir)
+    new_rows = snapshot_store.load_rows(latest, diff.changed, cache_dir)
+    counts = {}
+    for key in diff.changed:
+        before, after = old_rows[key], new_rows[key]
+        changed = [col for col in dict.fromkeys(list(before) + list(after)) if before.get(col, "") != after.get(col, "")]
+        diff.row_changes[key] = changed
+        for col in changed:
+            counts[col] = counts.get(col, 0) + 1
+    diff.changed_columns = dict(sorted(counts.items(), key=lambda item: -item[1]))
+    return diff
+
+
 # === Step C: 差分監視チェック ===
-def detect_snapshot_anomalies(cache_dir="cache"):
+class MonitorResult:
+    """差分監視 1 回分の結果（UI はこれを描画する）"""
+
+    OK = "ok"                      # 差分なし
+    CHANGED = "changed"            # 差分あり
+    INSUFFICIENT = "insufficient"  # スナップショットが 2 つ未満
+    ERROR = "error"
+
+    def __init__(self, status, diff=None, message="", checked_at=None, duration_sec=0.0):
+        self.status = status
+        self.diff = diff
+        self.message = message
+        self.checked_at = checked_at or datetime.now()
+        self.duration_sec = duration_sec
+
+    def lines(self):
+        """表示用の行を返す"""
+        if self.diff is not None:
+            return self.diff.summary_lines()
+        return [self.message]
+
+
+def check_snapshots(cache_dir="cache"):
+    """最新と前回のスナップショットを比較して MonitorResult を返す（print はしない）
+
+    差分スナップショットが 2 つ以上あればマニフェスト同士を、無ければ CSV の全件コピー同士を比較する。
+    """
+    import snapshot_store
+
+    start = time.perf_counter()
     try:
+        names = snapshot_store.list_snapshots(cache_dir)
+        if len(names) >= 2:
+            diff = diff_store_snapshots(names[-2], names[-1], cache_dir)
+            status = MonitorResult.OK if diff.identical else MonitorResult.CHANGED
+            return MonitorResult(status, diff=diff, duration_sec=time.perf_counter() - start)
         files = sorted(glob.glob(os.path.join(cache_dir, "cache_snapshot_*.csv")))
         if len(files) < 2:
-            print("[monitor] 差分検出には最低2つのスナップショットが必要です")
-            return
-        latest, previous = files[-1], files[-2]
-        df1 = pd.read_csv(previous)
-        df2 = pd.read_csv(latest)
-        if df1.equals(df2):
-            print("[monitor] 差分なし（スナップショット内容は同一です）")
-        else:
-            print("[monitor] 差分検出：最新スナップショットと前回に違いがあります")
-            print(f"前回: {previous}, 現在: {latest}")
-            print(f"前回行数: {len(df1)}, 現在行数: {len(df2)}")
+            return MonitorResult(MonitorResult.INSUFFICIENT, message="[monitor] 差分検出には最低2つのスナップショットが必要です",
+                                 duration_sec=time.perf_counter() - start)
+        diff = diff_snapshots(files[-2], files[-1])
+        status = MonitorResult.OK if diff.identical else MonitorResult.CHANGED
+        return MonitorResult(status, diff=diff, duration_sec=time.perf_counter() - start)
     except Exception as e:
-        print(f"[monitor] 差分チェックエラー: {e}")
+        return MonitorResult(MonitorResult.ERROR, message=f"[monitor] 差分チェックエラー: {e}",
+                             duration_sec=time.perf_counter() - start)
+
+
+def detect_snapshot_anomalies(cache_dir="cache"):
+    """最新と前回のスナップショットを比較して SnapshotDiff を返す（比較できない場合は None）"""
+    result = check_snapshots(cache_dir)
+    for line in result.lines():
+        print(line)
+    return result.diff
 
 # === Step D: CSV → キャッシュ復元 ===
-def restore_mapping_cache_from_csv(csv_path):
+# 拡張子 -> ログに出す形式名
+SNAPSHOT_FORMATS = {
+    ".csv": "CSV", ".feather": "Feather", ".arrow": "Feather", ".parquet": "Parquet",
+    ".pkl": "pickle", ".pickle": "pickle", ".json": "差分スナップショット",
+}
+_SNAPSHOT_TIME = re.compile(r"(\d{8}_\d{6}(?:_\d+)?)")
+
+
+def list_restorable_snapshots(cache_dir="cache"):
+    """復元に使えるスナップショットのパスを古い順に返す
+
+    全件コピー（CSV / Feather / Parquet）と差分スナップショットのマニフェストが対象。
+    CSV の列指向サイドカー（*.csv.feather）は CSV 本体から読むため含めない。
+    """
+    paths = [
+        path for ext in ("csv", "feather", "parquet") for path in glob.glob(os.path.join(cache_dir, f"cache_snapshot_*.{ext}"))
+        if not path.endswith(".csv" + SIDECAR_SUFFIX)
+    ]
+    paths += glob.glob(os.path.join(cache_dir, "manifests", "snapshot_*.json"))
+
+    def sort_key(path):
+        match = _SNAPSHOT_TIME.search(os.path.basename(path))
+        return (match.group(1) if match else "", os.path.basename(path))
+    return sorted(paths, key=sort_key)
+
+
+def read_snapshot_frame(path):
+    """スナップショットを DataFrame として読む（CSV のほか Feather / Parquet / pickle / 差分スナップショットに対応）"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".feather", ".arrow"):
+        return pd.read_feather(path)
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext in (".pkl", ".pickle"):
+        return pd.read_pickle(path)
+    if ext == ".json":
+        import snapshot_store
+        name = os.path.splitext(os.path.basename(path))[0]
+        cache_dir = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+        return snapshot_store.restore_snapshot_frame(name, cache_dir)
+    # CSV は列指向サイドカーがあればそちらを読む
+    return read_csv_with_sidecar(path)
+
+
+def _snapshot_keys(df):
+    """各行のキー（No.、無ければ auto_行番号）を返す"""
+    auto = [f"auto_{i}" for i in range(len(df))]
+    if SNAPSHOT_KEY_COLUMN not in df.columns:
+        return auto
+    numbers = df[SNAPSHOT_KEY_COLUMN]
+    present = numbers.notna().to_numpy()
+    return [str(number) if ok else fallback for number, ok, fallback in zip(numbers.tolist(), present, auto)]
+
+
+def _records_without_na(df):
+    """行ごとの辞書を作り、欠損値の項目を列単位で取り除く"""
+    records = df.to_dict("records")
+    missing = df.isna().to_numpy()
+    for j in np.flatnonzero(missing.any(axis=0)):
+        col = df.columns[j]
+        for i in np.flatnonzero(missing[:, j]):
+            del records[i][col]
+    return records
+
+
+class LazyMappingCache(Mapping):
+    """No. -> エントリ の読み取り専用マッピング。エントリは最初に参照されたときに作る"""
+
+    def __init__(self, df):
+        self._df = df
+        self._positions = {}
+        for position, key in enumerate(_snapshot_keys(df)):
+            self._positions[key] = position  # 同じ No. は後の行を優先（一括復元と同じ）
+        self._entries = {}
+
+    def __getitem__(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            row = self._df.iloc[self._positions[key]]
+            entry = self._entries[key] = row[row.notna()].to_dict()
+        return entry
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def materialize(self):
+        """全エントリを作って通常の dict として返す"""
+        return {key: self[key] for key in self}
+
+
+def restore_mapping_cache_from_csv(csv_path, lazy=False):
+    """スナップショットから No. -> エントリ（欠損値の項目は除く）を復元する
+
+    lazy=True では LazyMappingCache を返し、各エントリは参照されたときに作る。
+    """
     try:
-        df = pd.read_csv(csv_path)
-        mapping_cache = {}
-        for idx, row in df.iterrows():
-            entry = row.dropna().to_dict()
-            key = str(entry.get("No.", f"auto_{idx}"))
-            mapping_cache[key] = entry
-        print(f"[restore] CSVから {len(mapping_cache)} 件のキャッシュを復元しました")
+        df = read_snapshot_frame(csv_path)
+        if lazy:
+            mapping_cache = LazyMappingCache(df)
+        else:
+            mapping_cache = dict(zip(_snapshot_keys(df), _records_without_na(df)))
+        label = SNAPSHOT_FORMATS.get(os.path.splitext(csv_path)[1].lower(), "CSV")
+        print(f"[restore] {label}から {len(mapping_cache)} 件のキャッシュを復元しました")
         return mapping_cache
     except Exception as e:
         print(f"[restore] 復元エラー: {e}")
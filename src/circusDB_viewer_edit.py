@@ -3,16 +3,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import pandas as pd
-import os
-import csv
-import tkinter.font as tkFont
 from tkinter import filedialog
 import mapping_module  # mapping_module をインポート
+from circus_db_store import get_store
+from read_cache import read_table
 
 def load_company_names(csv_path="企業管理DB.csv"): # インデントを修正
     """企業管理DB.csvから企業名を読み込み、リストとして返す"""
     try:
-        df = pd.read_csv(csv_path, encoding="utf-8")
+        df = read_table(csv_path, copy=False, encoding="utf-8-sig")  # 変更が無ければキャッシュから返す
         company_names = df["企業名"].dropna().unique().tolist()  # 企業名カラムから重複を除いてリスト化
         return company_names
     except FileNotFoundError:
@@ -35,13 +34,13 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
         # pack_propagateをFalseに設定して、親フレームのサイズに影響されないようにする
         self.pack_propagate(False)
 
-        # circus_db.csv を読み込む
+        # circus_db.csv を共有ストア経由で読み込む（プレースホルダー用に先頭レコードのみ使用）
+        self.store = get_store(CIRCUS_DB_FILE)
         try:
-            self.df = pd.read_csv("circus_db.csv", encoding="utf-8-sig")
-        except FileNotFoundError:
-            self.df = pd.DataFrame(columns=[
-                # ... (既存の columns) ...
-            ])
+            first_record = self.store.first_record()
+        except Exception as e:
+            print(f"Error: circus_db.csv の読み込み中にエラーが発生しました: {e}")
+            first_record = {}
 
         self.field_sizes = {
             "求人タイトル": {"width": 60, "height": 2},
@@ -140,7 +139,7 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
             for material_field in self.material_fields:
                 if material_field.startswith(block):  # material_field が block で始まるかを確認
                     # circus_db.csv からプレースホルダーの値を読み込み
-                    placeholder_value = self.df.loc[0, material_field] if not self.df.empty and material_field in self.df.columns else ""
+                    placeholder_value = first_record.get(material_field, "")
 
                     # テキストボックスを作成し、プレースホルダーの値を設定
                     text_scrollbar = tk.Scrollbar(right_frame, orient="vertical")  # スクロールバーを作成
@@ -193,7 +192,7 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
 
                 # entry の初期値を circus_db.csv から取得 (サーカスID以外)
                 if field != "サーカスID":
-                    initial_value = self.df.loc[0, field] if not self.df.empty and field in self.df.columns else ""  # index 0 を仮定、カラムの存在を確認
+                    initial_value = first_record.get(field, "")  # 先頭レコードを仮定、カラムが無ければ空欄
                     entry.insert("1.0", initial_value)  # entry に初期値を設定
 
                 # スクロールバーとテキストボックスを連携
@@ -269,8 +268,8 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
 
         if selected_company:
             try:
-                df = pd.read_csv("circus_db.csv", encoding="utf-8-sig")
-                management_numbers = df[df["企業名"] == selected_company]["管理番号"].dropna().unique().tolist()
+                self.store.refresh(missing_ok=False)
+                management_numbers = self.store.list_management_numbers(selected_company)
                 self.management_number_entry["values"] = management_numbers
                 if management_numbers:
                     self.management_number_entry.set(management_numbers[0])  # 初期値を設定
@@ -288,19 +287,12 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
         management_number = self.management_number_entry.get().strip() 
 
         try:
-            # circus_db.csv を読み込む
-            df = pd.read_csv("circus_db.csv", encoding="utf-8-sig")
-
-            # 検索条件でデータをフィルタリング
-            df = df.fillna("")  # NaN を空文字に変換
-            filtered_df = df[
-                (df["管理番号"].astype(str) == str(management_number)) &  # 管理番号を str に変換
-                (df["企業名"].astype(str).isin([str(company_name)]))  # 企業名を str に変換
-            ]
+            # circus_db.csv の索引から (企業名, 管理番号) で直接引く（変更があった場合のみ再読込）
+            self.store.refresh(missing_ok=False)
+            record = self.store.get(company_name, management_number)
 
             # 該当するデータがあれば、入力エリアに表示
-            if not filtered_df.empty:
-                record = filtered_df.iloc[0].to_dict()  # 最初のレコードを取得
+            if record is not None:
                 print("record:", record)  # record変数の中身を出力
 
                 # 入力エリアに値を設定
@@ -340,15 +332,13 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
                 }
 
                 # その他のフィールドに初期値を設定
-                for column in df.columns:  # 既存のヘッダーからカラム名を取得
+                for column in self.store.columns:  # 既存のヘッダーからカラム名を取得
                     if column not in new_data:  # 企業名と管理番号以外は初期値を設定
                         new_data[column] = "（入力待ち）"
 
-                # circus_db.csv に追記
+                # circus_db.csv に追記（索引にも反映される）
                 try:
-                    with open("circus_db.csv", "a", encoding="utf-8-sig", newline="") as f:
-                        writer = csv.DictWriter(f, fieldnames=df.columns)  # 既存のヘッダーを使用
-                        writer.writerow(new_data)  # 新規データを追加
+                    self.store.append(new_data)  # 既存のヘッダーを使用して新規データを追加
                     messagebox.showinfo("保存完了", "新規データが circus_db.csv に保存されました。")
                 except Exception as e:
                     messagebox.showerror("エラー", f"保存中にエラーが発生しました: {e}")
@@ -373,13 +363,9 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
         data["Circus URL"] = self.circus_url_entry.get().strip()
         data["企業名"] = self.company_entry.get().strip()
 
-        # circus_db.csv の既存データを読み込む
-        csv_file = "circus_db.csv"
+        # circus_db.csv の既存データを読み込む（変更があった場合のみ）
         try:
-            if os.path.exists(csv_file):
-                self.df = pd.read_csv(csv_file, encoding="utf-8-sig", dtype=str).fillna("")
-            else:
-                self.df = pd.DataFrame(columns=data.keys())
+            self.store.refresh()
         except Exception as e:
             messagebox.showerror("エラー", f"CSV 読み込みエラー: {e}")
             return
@@ -389,18 +375,12 @@ class CircusDB_viewer_edit(tk.Frame):  # クラス名が CircusDB_viewer_edit 
             if not isinstance(data.get(key), str) or pd.isna(data[key]):
                 data[key] = ""
 
-        # 管理番号をキーにしてデータを更新
-        if "管理番号" in self.df.columns and data["管理番号"] in self.df["管理番号"].astype(str).values:
-            self.df.loc[self.df["管理番号"].astype(str) == data["管理番号"], data.keys()] = list(data.values())
-        else:
-            self.df = pd.concat([self.df, pd.DataFrame([data])], ignore_index=True)
-
-        # **データの型を統一 (検索時に一致するようにする)**
-        self.df = self.df.astype(str)
+        # (企業名, 管理番号) をキーにしてデータを更新（無ければ追加）
+        self.store.upsert(data)
 
         # データを保存
         try:
-            self.df.to_csv(csv_file, index=False, encoding="utf-8-sig")
+            self.store.save()
             messagebox.showinfo("保存完了", "データが circus_db.csv に保存されました。")
         except Exception as e:
             messagebox.showerror("エラー", f"保存中にエラーが発生しました: {e}")
@@ -0,0 +1,226 @@
+# === このファイルの責務（GPT用構造補助） ===
+# circus_db_journal.py：
+# circus_db.csv のジャーナル（追記専用の変更ログ）を扱う
+# 保存時は「キー + 変更列 + 時刻」を 1 行の JSON として追記し、
+# 読み込み時は最後に圧縮したベース CSV にログを再生して最新状態を得る
+# ログが閾値を超えたらバックグラウンドでベース CSV に畳み込む（コンパクション）
+
+import os
+import json
+import threading
+from datetime import datetime
+import pandas as pd
+from atomic_writer import locked_append, write_dataframe
+from binary_snapshot import read_csv_with_sidecar, write_sidecar
+
+JOURNAL_SUFFIX = ".journal"
+COMPACTING_SUFFIX = ".journal.compacting"
+# ログがこのサイズを超えたらコンパクションを開始する
+COMPACT_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+# パスごとの世代番号。reset() のたびに進め、compact() は開始時と世代が変わっていたら結果を捨てる
+_generations = {}
+
+
+def journal_path(csv_path):
+    return csv_path + JOURNAL_SUFFIX
+
+
+def compacting_path(csv_path):
+    return csv_path + COMPACTING_SUFFIX
+
+
+def _lock_for(csv_path):
+    key = os.path.abspath(csv_path)
+    with _path_locks_guard:
+        return _path_locks.setdefault(key, threading.RLock())
+
+
+def path_lock(csv_path):
+    """circus_db ごとのロック（ログ・ベースの読み書きを直列化する。同じスレッドでの入れ子は可）"""
+    return _lock_for(csv_path)
+
+
+# === 書き込み ===
+def append_changes(csv_path, changes, compact_threshold=COMPACT_THRESHOLD_BYTES):
+    """変更レコード [(キー, 変更列dict), ...] をログに追記する"""
+    if not changes:
+        return
+    ts = datetime.now().isoformat(timespec="seconds")
+    lines = [
+        json.dumps({"ts": ts, "key": list(key), "fields": fields}, ensure_ascii=False) + "\n"
+        for key, fields in changes
+    ]
+    with _lock_for(csv_path):
+        if _ends_with_partial_line(journal_path(csv_path)):
+            # 前回の書き込みが途中で止まっていた場合、その行とつながらないよう改行を挟む
+            lines.insert(0, "\n")
+        with locked_append(journal_path(csv_path), encoding="utf-8") as f:
+            f.writelines(lines)
+        size = os.path.getsize(journal_path(csv_path))
+    if compact_threshold and size > compact_threshold:
+        compact_in_background(csv_path)
+
+
+def _ends_with_partial_line(path):
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except FileNotFoundError:
+        return False
+
+
+# === 読み込み ===
+def iter_records(path):
+    """ログのレコードを順に返す（クラッシュで途中まで書かれた行は読み飛ばす）"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                key = tuple(record["key"])
+                fields = record["fields"]
+            except (ValueError, KeyError, TypeError):
+                print(f"[journal] 壊れたレコードを読み飛ばしました: {path}")
+                continue
+            yield key, fields
+
+
+def iter_all_records(csv_path):
+    """コンパクション中のログ → 現在のログの順にレコードを返す"""
+    yield from iter_records(compacting_path(csv_path))
+    yield from iter_records(journal_path(csv_path))
+
+
+def replay(rows, columns, records, key_columns=("企業名", "管理番号")):
+    """rows（dict のリスト）にレコードを適用する。columns も必要に応じて拡張する"""
+    positions = {}
+    for position, row in enumerate(rows):
+        key = tuple(str(row.get(col, "")).strip() for col in key_columns)
+        positions.setdefault(key, []).append(position)
+    for key, fields in records:
+        for col in fields:
+            if col not in columns:
+                columns.append(col)
+        if key in positions:
+            for position in positions[key]:
+                rows[position].update(fields)
+        else:
+            row = dict(zip(key_columns, key))
+            row.update(fields)
+            rows.append(row)
+            positions[key] = [len(rows) - 1]
+    return rows, columns
+
+
+def _base_read_options(encoding):
+    return {"encoding": encoding, "dtype": str, "keep_default_na": False}
+
+
+def read_base(csv_path, encoding="utf-8-sig"):
+    """ベース CSV を (rows, columns) として読む"""
+    if not os.path.exists(csv_path):
+        return [], []
+    df = read_csv_with_sidecar(csv_path, **_base_read_options(encoding))
+    return df.to_dict("records"), list(df.columns)
+
+
+def read_circus_db(csv_path, encoding="utf-8-sig"):
+    """ベース CSV にログを再生した DataFrame を返す"""
+    with _lock_for(csv_path):
+        rows, columns = read_base(csv_path, encoding)
+        rows, columns = replay(rows, columns, iter_all_records(csv_path))
+    return pd.DataFrame(rows, columns=columns).fillna("")
+
+
+def journal_signature(csv_path):
+    """ログ 2 種の (mtime_ns, size)。変更検知に使う"""
+    signature = []
+    for path in (compacting_path(csv_path), journal_path(csv_path)):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+# === コンパクション ===
+def write_base(csv_path, df, encoding="utf-8-sig"):
+    """ベース CSV を一時ファイル経由で置き換える"""
+    write_dataframe(df, csv_path, encoding=encoding)
+    write_sidecar(df, csv_path, _base_read_options(encoding))
+
+
+def _generation(csv_path):
+    return _generations.get(os.path.abspath(csv_path), 0)
+
+
+def reset(csv_path, df, encoding="utf-8-sig"):
+    """df を新しいベースとして書き、ログ（退避中のものを含む）を空にする（全件書き換え時に使う）
+
+    書いた行数を返す。実行中のコンパクションがあれば、その結果は捨てられる。
+    """
+    with _lock_for(csv_path):
+        write_base(csv_path, df, encoding)
+        for path in (compacting_path(csv_path), journal_path(csv_path)):
+            if os.path.exists(path):
+                os.remove(path)
+        key = os.path.abspath(csv_path)
+        _generations[key] = _generations.get(key, 0) + 1
+    return len(df)
+
+
+def compact(csv_path, encoding="utf-8-sig"):
+    """ログをベース CSV に畳み込む。畳み込んだレコード数を返す"""
+    with _lock_for(csv_path):
+        # 新しい追記は空のログに向かうよう、先にログを退避する（ロックはここだけ短く持つ）
+        if os.path.exists(journal_path(csv_path)) and not os.path.exists(compacting_path(csv_path)):
+            os.replace(journal_path(csv_path), compacting_path(csv_path))
+        if not os.path.exists(compacting_path(csv_path)):
+            return 0
+        generation = _generation(csv_path)
+    records = list(iter_records(compacting_path(csv_path)))
+    rows, columns = read_base(csv_path, encoding)
+    rows, columns = replay(rows, columns, records)
+    df = pd.DataFrame(rows, columns=columns).fillna("")
+    with _lock_for(csv_path):
+        if _generation(csv_path) != generation:
+            # 畳み込み中に reset() で全件書き換えされた場合は、読み込んだ内容が古いので何もしない
+            return 0
+        write_base(csv_path, df, encoding)
+        # ベースの置き換え後に退避ログを消す（途中で落ちても再生は冪等）
+        os.remove(compacting_path(csv_path))
+    print(f"[journal] {len(records)} 件の変更を {csv_path} に畳み込みました")
+    return len(records)
+
+
+_compaction_threads = {}
+
+
+def compact_in_background(csv_path, encoding="utf-8-sig"):
+    """コンパクションを別スレッドで実行する（同じファイルで多重起動しない）"""
+    key = os.path.abspath(csv_path)
+    thread = _compaction_threads.get(key)
+    if thread is not None and thread.is_alive():
+        return thread
+
+    def run():
+        try:
+            compact(csv_path, encoding)
+        except Exception as e:
+            print(f"[journal] コンパクションエラー: {e}")
+
+    thread = threading.Thread(target=run, name="circus-db-compaction", daemon=True)
+    _compaction_threads[key] = thread
+    thread.start()
+    return thread
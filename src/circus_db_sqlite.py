@@ -0,0 +1,203 @@
+# === このファイルの責務（GPT用構造補助） ===
+# circus_db_sqlite.py：
+# circus_db の SQLite バックエンド（WAL モード、主キー = 企業名 + 管理番号）
+# CircusDBStore と同じ参照・更新メソッドを持ち、保存は 1 行単位の UPSERT になる
+# 既存の circus_db.csv との相互変換（import_csv / export_csv）もここで担う
+
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+from circus_db_store import KEY_COLUMNS, make_key
+from atomic_writer import write_dataframe
+
+TABLE_NAME = "circus_db"
+
+
+def default_sqlite_path(csv_path):
+    """circus_db.csv と同じ場所に置く SQLite ファイルのパス"""
+    return os.path.splitext(csv_path)[0] + ".sqlite3"
+
+
+def _quote(name):
+    """カラム名を SQL 識別子としてクォートする（日本語・記号を含むため）"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class SQLiteCircusDBStore:
+    """circus_db の SQLite ストア（CircusDBStore と同じインターフェース）"""
+
+    def __init__(self, csv_path, db_path=None, encoding="utf-8-sig"):
+        self.path = csv_path
+        self.db_path = db_path or default_sqlite_path(csv_path)
+        self.encoding = encoding
+        self._lock = threading.RLock()
+        is_new = not os.path.exists(self.db_path)
+        self.conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+        self._create_table()
+        self._columns = self._read_columns()
+        # 初回のみ既存の circus_db.csv を取り込む
+        if is_new and os.path.exists(self.path):
+            self.import_csv(self.path)
+
+    # === スキーマ ===
+    def _create_table(self):
+        # 主キー (企業名, 管理番号) の自動索引が「企業名で絞って管理番号を返す」検索の
+        # カバリングインデックスを兼ねるため、追加の索引は作らない
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} ("
+            f"{_quote('企業名')} TEXT NOT NULL, {_quote('管理番号')} TEXT NOT NULL, "
+            f"PRIMARY KEY ({_quote('企業名')}, {_quote('管理番号')}))"
+        )
+        self.conn.commit()
+
+    def _read_columns(self):
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({TABLE_NAME})")]
+
+    def _ensure_columns(self, columns):
+        missing = [col for col in columns if col not in self._columns]
+        for col in missing:
+            self.conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {_quote(col)} TEXT DEFAULT ''")
+            self._columns.append(col)
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    # === 参照 ===
+    def refresh(self, missing_ok=True):
+        """SQLite は常に最新を参照するため再読込は不要"""
+        return False
+
+    def get(self, company_name, management_number):
+        """(企業名, 管理番号) に一致するレコードを返す（無ければ None）"""
+        with self._lock:
+            cursor = self.conn.execute(
+                f"SELECT * FROM {TABLE_NAME} WHERE {_quote('企業名')} = ? AND {_quote('管理番号')} = ?",
+                make_key(company_name, management_number),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            names = [d[0] for d in cursor.description]
+            return {name: "" if value is None else value for name, value in zip(names, row)}
+
+    def list_management_numbers(self, company_name):
+        """企業名に紐づく管理番号を返す（主キー索引のみで完結する）"""
+        with self._lock:
+            cursor = self.conn.execute(
+                f"SELECT {_quote('管理番号')} FROM {TABLE_NAME} WHERE {_quote('企業名')} = ? AND {_quote('管理番号')} != ''",
+                (str(company_name).strip(),),
+            )
+            return [row[0] for row in cursor]
+
+    def first_record(self):
+        """先頭レコードを返す（プレースホルダー表示用）"""
+        with self._lock:
+            cursor = self.conn.execute(f"SELECT * FROM {TABLE_NAME} ORDER BY rowid LIMIT 1")
+            row = cursor.fetchone()
+            if row is None:
+                return {}
+            names = [d[0] for d in cursor.description]
+            return {name: "" if value is None else value for name, value in zip(names, row)}
+
+    def to_frame(self):
+        """テーブル全体を DataFrame として返す"""
+        with self._lock:
+            df = pd.read_sql_query(f"SELECT * FROM {TABLE_NAME} ORDER BY rowid", self.conn)
+            return df.fillna("")
+
+    # === 更新 ===
+    def upsert(self, record):
+        """1 行を UPSERT する。"inserted" / "updated" / "unchanged" を返す"""
+        return self.upsert_many([record])[0]
+
+    def upsert_many(self, records):
+        """複数行を 1 トランザクションで UPSERT し、各行の結果を返す"""
+        results = []
+        with self._lock:
+            try:
+                for record in records:
+                    results.append(self._upsert_one(record))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return results
+
+    def _upsert_one(self, record):
+        record = {col: "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
+                  for col, value in record.items()}
+        key = make_key(record.get("企業名", ""), record.get("管理番号", ""))
+        record["企業名"], record["管理番号"] = key
+        self._ensure_columns(record.keys())
+        columns = list(record.keys())
+        updates = [col for col in columns if col not in KEY_COLUMNS]
+        # 既存行と値が同じなら書き込まない（CSV・ジャーナルと同じく "unchanged" を返す）
+        current = self.conn.execute(
+            f"SELECT {', '.join(_quote(c) for c in updates) or 1} FROM {TABLE_NAME} "
+            f"WHERE {_quote('企業名')} = ? AND {_quote('管理番号')} = ?", key
+        ).fetchone()
+        if current is not None and all(("" if old is None else old) == record[col] for col, old in zip(updates, current)):
+            return "unchanged"
+        sql = (
+            f"INSERT INTO {TABLE_NAME} ({', '.join(_quote(c) for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        if updates:
+            sql += (
+                f" ON CONFLICT({_quote('企業名')}, {_quote('管理番号')}) DO UPDATE SET "
+                + ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in updates)
+            )
+        else:
+            sql += f" ON CONFLICT({_quote('企業名')}, {_quote('管理番号')}) DO NOTHING"
+        self.conn.execute(sql, [record[c] for c in columns])
+        return "inserted" if current is None else "updated"
+
+    def append(self, record):
+        """新規レコードを追加する（SQLite では UPSERT と同じ）"""
+        self.upsert(record)
+
+    def save(self):
+        """UPSERT 時点でコミット済みのため何もしない"""
+        return None
+
+    # === CSV ブリッジ ===
+    def import_csv(self, csv_path=None):
+        """circus_db.csv を取り込む（重複キー・取り込み済みのキーは飛ばす）。実際に追加した行数を返す"""
+        csv_path = csv_path or self.path
+        df = pd.read_csv(csv_path, encoding=self.encoding, dtype=str, keep_default_na=False)
+        for col in KEY_COLUMNS:
+            if col not in df.columns:
+                raise ValueError(f"{csv_path} に '{col}' 列がありません")
+            df[col] = df[col].str.strip()
+        with self._lock:
+            self._ensure_columns(df.columns)
+            columns = list(df.columns)
+            sql = (
+                f"INSERT INTO {TABLE_NAME} ({', '.join(_quote(c) for c in columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT({_quote('企業名')}, {_quote('管理番号')}) DO NOTHING"
+            )
+            before = self.conn.total_changes
+            self.conn.executemany(sql, df.itertuples(index=False, name=None))
+            self.conn.commit()
+            inserted = self.conn.total_changes - before
+        print(f"[sqlite] {csv_path} から {inserted} 行を取り込みました（{len(df)} 行中）")
+        return inserted
+
+    def export_csv(self, csv_path=None):
+        """テーブル全体を CSV に書き出す（CSV を直接読む既存ツール向け）"""
+        csv_path = csv_path or self.path
+        df = self.to_frame()
+        write_dataframe(df, csv_path, encoding=self.encoding)
+        print(f"[sqlite] {len(df)} 行を {csv_path} に書き出しました")
+        return len(df)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,250 @@
+# === このファイルの責務（GPT用構造補助） ===
+# circus_db_store.py：
+# circus_db.csv を一度だけ読み込み、(企業名, 管理番号) のハッシュ索引と
+# 企業名ごとの副索引を保持する共有ストアを提供する
+# ファイルの mtime / size が変化した場合のみ読み込み直す
+# ジャーナルモードでは保存を変更ログへの追記で行う（circus_db_journal.py）
+
+import os
+import csv
+import threading
+import pandas as pd
+import circus_db_journal
+from atomic_writer import file_lock, write_dataframe, locked_append
+from binary_snapshot import read_csv_with_sidecar, write_sidecar
+
+CIRCUS_DB_FILE = "circus_db.csv"
+KEY_COLUMNS = ("企業名", "管理番号")
+
+# 保存先バックエンド（"csv" / "sqlite" / "journal"）。環境変数 CIRCUS_DB_BACKEND で切り替える
+CIRCUS_DB_BACKEND = os.environ.get("CIRCUS_DB_BACKEND", "csv")
+# 行単位で保存できる（全件書き換えが不要な）バックエンド
+KEYED_BACKENDS = ("sqlite", "journal")
+
+# パスごとに共有されるストア（タブ間で同じインスタンスを使う）
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=CIRCUS_DB_FILE, backend=None):
+    """パス・バックエンドごとに共有されるストアを返す"""
+    backend = backend or CIRCUS_DB_BACKEND
+    key = (os.path.abspath(path), backend)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == "sqlite":
+                from circus_db_sqlite import SQLiteCircusDBStore
+                store = SQLiteCircusDBStore(path)
+            elif backend == "csv":
+                store = CircusDBStore(path)
+            elif backend == "journal":
+                store = CircusDBStore(path, journal=True)
+            else:
+                raise ValueError(f"未対応のバックエンドです: {backend}")
+            _stores[key] = store
+        return store
+
+
+def file_signature(path):
+    """(mtime_ns, size) を返す。ファイルが無い場合は None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def make_key(company_name, management_number):
+    """索引キーを作る（検索時と同じく文字列・前後空白なしで比較する）"""
+    return (str(company_name).strip(), str(management_number).strip())
+
+
+class CircusDBStore:
+    """circus_db.csv のインメモリ索引付きストア"""
+
+    def __init__(self, path=CIRCUS_DB_FILE, encoding="utf-8-sig", journal=False):
+        self.path = path
+        self.encoding = encoding
+        self.journal = journal
+        self._pending = []        # ジャーナルモードで未保存の (キー, 変更列)
+        self.columns = []
+        self.rows = []
+        self._key_index = {}      # (企業名, 管理番号) -> [行位置, ...]
+        self._company_index = {}  # 企業名 -> {管理番号: None}（挿入順を保持）
+        self._signature = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    # === 読み込み ===
+    def refresh(self, missing_ok=True):
+        """ファイルが変更されていれば読み込み直す。読み込んだ場合 True を返す
+
+        未保存の変更がある間は読み込み直さない（読み込むとメモリ上の変更が失われるため）。
+        """
+        with self._lock:
+            if self._pending:
+                return False
+            base_signature = file_signature(self.path)
+            if base_signature is None and not missing_ok:
+                raise FileNotFoundError(self.path)
+            signature = self._current_signature(base_signature)
+            if self._loaded and signature == self._signature:
+                return False
+            self._load(base_signature)
+            self._signature = signature
+            return True
+
+    def _current_signature(self, base_signature=None):
+        if base_signature is None:
+            base_signature = file_signature(self.path)
+        if self.journal:
+            return (base_signature, circus_db_journal.journal_signature(self.path))
+        return base_signature
+
+    def _load(self, base_signature):
+        if base_signature is None:
+            columns, rows = [], []
+        else:
+            df = read_csv_with_sidecar(self.path, **self._read_options())
+            columns = list(df.columns)
+            rows = df.to_dict("records")
+        if self.journal:
+            # 最後に畳み込んだベースにログを再生する
+            rows, columns = circus_db_journal.replay(rows, columns, circus_db_journal.iter_all_records(self.path))
+            rows = [{col: row.get(col, "") for col in columns} for row in rows]
+        self._pending = []
+        self.columns = columns
+        self.rows = rows
+        self._rebuild_index()
+        self._loaded = True
+
+    def _read_options(self):
+        return {"encoding": self.encoding, "dtype": str, "keep_default_na": False}
+
+    def _rebuild_index(self):
+        self._key_index = {}
+        self._company_index = {}
+        for position, row in enumerate(self.rows):
+            self._index_row(position, row)
+
+    def _index_row(self, position, row):
+        key = make_key(row.get("企業名", ""), row.get("管理番号", ""))
+        self._key_index.setdefault(key, []).append(position)
+        if key[1]:
+            self._company_index.setdefault(key[0], {})[key[1]] = None
+
+    # === 参照 ===
+    def get(self, company_name, management_number):
+        """(企業名, 管理番号) に一致する最初のレコードを返す（無ければ None）"""
+        with self._lock:
+            self.refresh()
+            positions = self._key_index.get(make_key(company_name, management_number))
+            if not positions:
+                return None
+            return dict(self.rows[positions[0]])
+
+    def list_management_numbers(self, company_name):
+        """企業名に紐づく管理番号を登録順で返す"""
+        with self._lock:
+            self.refresh()
+            return list(self._company_index.get(str(company_name).strip(), {}))
+
+    def first_record(self):
+        """先頭レコードを返す（プレースホルダー表示用）"""
+        with self._lock:
+            self.refresh()
+            return dict(self.rows[0]) if self.rows else {}
+
+    def to_frame(self):
+        """現在の内容を DataFrame として返す"""
+        with self._lock:
+            self.refresh()
+            return pd.DataFrame(self.rows, columns=self.columns)
+
+    # === 更新 ===
+    def upsert(self, record):
+        """キーが一致する行を更新し、無ければ追加する（メモリ上のみ）
+
+        "inserted" / "updated" / "unchanged" を返す
+        """
+        with self._lock:
+            self.refresh()
+            return self._upsert(record)
+
+    def _upsert(self, record):
+        with self._lock:
+            record = {col: "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
+                      for col, value in record.items()}
+            for col in record:
+                if col not in self.columns:
+                    self.columns.append(col)
+            key = make_key(record.get("企業名", ""), record.get("管理番号", ""))
+            positions = self._key_index.get(key)
+            if positions:
+                current = self.rows[positions[0]]
+                changed = {col: value for col, value in record.items() if current.get(col, "") != value}
+                if not changed:
+                    return "unchanged"
+                for position in positions:
+                    self.rows[position].update(record)
+                self._pending.append((key, changed))
+                return "updated"
+            self.rows.append(record)
+            self._index_row(len(self.rows) - 1, record)
+            self._pending.append((key, record))
+            return "inserted"
+
+    def append(self, record):
+        """新規レコードをファイル末尾に追記し、索引にも反映する"""
+        with self._lock:
+            self.refresh()
+            if self.journal:
+                self.upsert(record)
+                self.save()
+                return
+            fieldnames = self.columns or list(record.keys())
+            with locked_append(self.path, encoding=self.encoding) as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+                if f.tell() == 0:
+                    writer.writeheader()
+                writer.writerow(record)
+            if not self.columns:
+                self.columns = list(fieldnames)
+            row = {col: "" if record.get(col) is None else str(record.get(col)) for col in self.columns}
+            self.rows.append(row)
+            self._index_row(len(self.rows) - 1, row)
+            self._signature = file_signature(self.path)
+
+    def upsert_many(self, records):
+        """複数行を更新・追加して保存し、各行の結果を返す"""
+        with self._lock:
+            # 読み込み直すのは最初の 1 回だけ（途中でコンパクションがあっても変更を失わない）
+            self.refresh()
+            results = [self._upsert(record) for record in records]
+            self.save()
+            return results
+
+    def save(self):
+        """メモリ上の内容を circus_db.csv に書き出す（ジャーナルモードでは変更分のみ追記）"""
+        with self._lock:
+            if self.journal:
+                circus_db_journal.append_changes(self.path, self._pending)
+            else:
+                # 全件を書き直すため、読み込み後に他から保存されていれば読み直して変更を再適用する
+                with file_lock(self.path):
+                    if file_signature(self.path) != self._signature:
+                        self._reload_keeping_pending()
+                    df = pd.DataFrame(self.rows, columns=self.columns).fillna("")
+                    write_dataframe(df, self.path, encoding=self.encoding)
+                    # 次回起動時に CSV をパースせずに済むよう、列指向サイドカーも更新する
+                    write_sidecar(df, self.path, self._read_options())
+            self._pending = []
+            self._signature = self._current_signature()
+
+    def _reload_keeping_pending(self):
+        pending = self._pending
+        base_signature = file_signature(self.path)
+        self._load(base_signature)
+        for key, fields in pending:
+            self._upsert({**dict(zip(KEY_COLUMNS, key)), **fields})
@@ -2,34 +2,47 @@
 # このファイルは Circus支援ツールのランチャーUIを提供する
 # 各種サブモジュール（台帳、マッピング、DB編集、ID生成など）をタブUIに統合する役割を担う
 
+# 起動を速くするため、pandas と各ツールのモジュールは使うとき（タブの構築時）に import する
+
 import sys
 import os
-import tkinter as tk
-from tkinter import ttk
+import time
+import threading
+import traceback
 
-from ledger_creator import LedgerCreatorApp
-from No_sakusei_fixed import InputUI, IdGenerator
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
 
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import startup_profiler
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    # 以降の import（tkinter を含む）の時間を計測する
+    startup_profiler.enable()
 
-from kigyouDB import KigyouDBManager
-from mapping_tool import MappingTool
-from circusDB_viewer_edit import CircusDB_viewer_edit
-from mapping_module import MappingToolUI
+import argparse
+import tkinter as tk
+from tkinter import ttk
+
+from snapshot_monitor import SnapshotMonitor
 
-from cache_snapshot_utils import detect_snapshot_anomalies, restore_mapping_cache_from_csv
-import glob
+# 起動後に他のタブのデータをバックグラウンドで先読みするか（CIRCUS_PREWARM=0 で無効）
+PREWARM_ENABLED = os.environ.get("CIRCUS_PREWARM", "1") != "0"
 
 class CacheMonitorFrame(tk.Frame):
-    def __init__(self, master=None):
+    def __init__(self, master=None, monitor=None):
         super().__init__(master)
         self.create_widgets()
+        # 差分監視はバックグラウンドで行い、結果は render_result で表示する
+        self.monitor = monitor or SnapshotMonitor(self)
+        self.monitor.add_listener(self.render_result)
+        self.bind("<Destroy>", self._on_destroy)
 
     def create_widgets(self):
         btn_monitor = tk.Button(self, text="🕵️ 差分監視実行", command=self.run_monitoring)
         btn_monitor.pack(pady=5)
         btn_restore = tk.Button(self, text="♻️ 最新復元実行", command=self.restore_latest)
         btn_restore.pack(pady=5)
+        self.status_label = tk.Label(self, text="差分監視: 未実行", anchor="w")
+        self.status_label.pack(fill=tk.X, padx=5)
 
         self.text = tk.Text(self, wrap='none', height=30)
         scrollbar = tk.Scrollbar(self, command=self.text.yview)
@@ -38,35 +51,80 @@ class CacheMonitorFrame(tk.Frame):
         self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
     def run_monitoring(self):
+        if self.monitor.check_now():
+            self.status_label.config(text="差分監視: 実行中...")
+        else:
+            self.status_label.config(text="差分監視: 前回のチェックが実行中です")
+
+    def render_result(self, result):
+        """MonitorResult をテキスト欄に表示する"""
+        from cache_snapshot_utils import MonitorResult
+
         self.text.delete(1.0, tk.END)
-        try:
-            detect_snapshot_anomalies()
+        for line in result.lines():
+            self.text.insert(tk.END, line + "\n")
+        if result.status == MonitorResult.ERROR:
+            self.text.insert(tk.END, "[ERR] 差分監視中エラー\n")
+        else:
             self.text.insert(tk.END, "[OK] 差分監視完了\n")
-        except Exception as e:
-            self.text.insert(tk.END, f"[ERR] 差分監視中エラー: {e}\n")
+        interval = f" / {self.monitor.interval_sec} 秒ごとに再チェック" if self.monitor.interval_sec > 0 else ""
+        self.status_label.config(
+            text=f"差分監視: 最終チェック {result.checked_at:%H:%M:%S}（{result.duration_sec:.2f} 秒）{interval}")
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self.monitor.remove_listener(self.render_result)
 
     def restore_latest(self):
         self.text.delete(1.0, tk.END)
         try:
-            files = sorted(glob.glob("cache/cache_snapshot_*.csv"))
+            from cache_snapshot_utils import list_restorable_snapshots, restore_mapping_cache_from_csv
+
+            # CSV / Feather / Parquet と差分スナップショットの中から、時刻の最も新しいものを選ぶ
+            files = list_restorable_snapshots("cache")
             if not files:
                 self.text.insert(tk.END, "スナップショットが存在しません\n")
                 return
             latest = files[-1]
             restored = restore_mapping_cache_from_csv(latest)
-            self.text.insert(tk.END, f"[OK] {len(restored)} 件 復元成功\n")
+            self.text.insert(tk.END, f"[OK] {os.path.basename(latest)} から {len(restored)} 件 復元成功\n")
         except Exception as e:
             self.text.insert(tk.END, f"[ERR] 復元中エラー: {e}\n")
 
+def prewarm_shared_data():
+    """各タブが構築時に読むファイルを先に読み込み、共有キャッシュに載せておく（バックグラウンド用）"""
+    from read_cache import read_table
+    from circus_db_store import get_store
+    from mapping_rule_repository import get_repository
+
+    tasks = (
+        ("企業管理DB.csv", lambda: read_table("企業管理DB.csv", copy=False, encoding="utf-8-sig")),
+        ("circus_db.csv", lambda: get_store("circus_db.csv").first_record()),
+        ("circus_db_mapping.csv", lambda: get_repository("circus_db_mapping.csv").rows()),
+    )
+    for name, task in tasks:
+        try:
+            task()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[prewarm] {name} の先読みに失敗しました: {e}")
+
+
 class CircusSupportTool:
-    def __init__(self, root):
+    def __init__(self, root, prewarm=PREWARM_ENABLED):
         self.root = root
+        # 各ツールは作業フォルダ（このファイルのフォルダ）からの相対パスでファイルを読む
+        os.chdir(BASE_DIR)
         self.root.title("Circus Support Tool")
         self.root.geometry("1200x800")
 
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill=tk.BOTH, expand=True)
 
+        # キャッシュスナップショットの差分監視（UI スレッドの外で実行し、一定間隔で再チェック）
+        self.snapshot_monitor = SnapshotMonitor(self.root)
+
         # サブウインドウ：終了ラベル専用
         exit_window = tk.Toplevel(self.root)
         exit_window.overrideredirect(True)
@@ -120,85 +178,128 @@ class CircusSupportTool:
         exit_label.bind("<ButtonRelease-1>", on_release)
 
 
-        # 企業DB管理
+        # 各タブは「ファクトリ」として登録し、最初に表示されたときに中身を作る
+        self._tab_factories = {}   # タブのフレーム名 -> (タブ名, ファクトリ)
+        self.tab_build_times = {}  # タブ名 -> 構築にかかった秒数
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        self.register_tab("企業DB管理", self._build_kigyou_db)
+        self.register_tab("マッピングツール", self._build_mapping_tool)
+        self.register_tab("Circus DB 編集", self._build_circus_db_editor)
+        self.register_tab("マッピングプレビューUI", self._build_mapping_preview)
+        self.register_tab("管理台帳作成", self._build_ledger_creator)
+        self.register_tab("ID発行フォーム", self._build_id_generator)
+        self.register_tab("Cacheモニター", self._build_cache_monitor)
+
+        # 最初に表示されるタブだけを作る
+        self._build_tab(self.notebook.select())
+
+        # 他のタブが使う CSV などをバックグラウンドで先読みしておく
+        if prewarm:
+            threading.Thread(target=prewarm_shared_data, name="tab-prewarm", daemon=True).start()
+
+        # 起動時にキャッシュスナップショットの差分を監視（結果は Cacheモニタータブに表示）
+        self.snapshot_monitor.add_listener(self._log_snapshot_result)
+        self.snapshot_monitor.start()
+
+    # === タブの遅延構築 ===
+    def register_tab(self, title, factory):
+        """空のタブを追加し、factory(frame) を最初に表示されたときに呼ぶよう登録する"""
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=title)
+        self._tab_factories[str(frame)] = (title, factory)
+        return frame
+
+    def _on_tab_changed(self, event):
+        self._build_tab(self.notebook.select())
+
+    def _build_tab(self, tab_id):
+        entry = self._tab_factories.pop(str(tab_id), None)
+        if entry is None:
+            return  # 構築済み（またはタブなし）
+        title, factory = entry
+        frame = self.notebook.nametowidget(tab_id)
+        start = time.perf_counter()
         try:
-            KigyouDBManager.add_to_tab(self.notebook)
-        except AttributeError:
-            frame = ttk.Frame(self.notebook)
-            self.notebook.add(frame, text="企業DB管理")
-            KigyouDBManager(frame).pack(fill=tk.BOTH, expand=True)
+            factory(frame)
+        except Exception as e:
+            print(f"{title} 起動エラー: {e}")
+            traceback.print_exc()
+        self.tab_build_times[title] = time.perf_counter() - start
+        startup_profiler.record_tab(title, self.tab_build_times[title])
+
+    # === 各タブのファクトリ ===
+    def _build_kigyou_db(self, frame):
+        # 企業DB管理
+        from kigyouDB import KigyouDBManager
+        KigyouDBManager(frame).pack(fill=tk.BOTH, expand=True)
 
+    def _build_mapping_tool(self, frame):
         # マッピングツール
-        try:
-            MappingTool.add_to_tab(self.notebook)
-        except AttributeError:
-            frame = ttk.Frame(self.notebook)
-            self.notebook.add(frame, text="マッピングツール")
-            MappingTool(frame).pack(fill=tk.BOTH, expand=True)
+        from mapping_tool import MappingTool
+        MappingTool(frame).pack(fill=tk.BOTH, expand=True)
 
-        # Circus DB 編集ビューア
-        try:
-            CircusDB_viewer_edit.add_to_tab(self.notebook)
-        except AttributeError:
-            # タブに追加するためのフレームを作成し、この中にCircusDB_viewer_editを配置
-            frame = ttk.Frame(self.notebook)
-            self.notebook.add(frame, text="Circus DB 編集")
-            
-            # CircusDB_viewer_editを作成し、フレーム内に適切に配置
-            # フレームの内部に合わせて完全に拡張されるようにpackオプションを調整
-            circusDB_editor = CircusDB_viewer_edit(frame)
-            
-            # 上下左右の余白を無くすために、padxとpadyを0に設定
-            circusDB_editor.pack(fill=tk.BOTH, expand=True, padx=0, pady=0)
-            
-            # フレーム自体のサイズも調整
-            frame.pack_propagate(False)
+    def _build_circus_db_editor(self, frame):
+        # Circus DB 編集ビューア（フレームの内部に合わせて完全に拡張されるよう余白なしで配置）
+        from circusDB_viewer_edit import CircusDB_viewer_edit
+        circusDB_editor = CircusDB_viewer_edit(frame)
+        circusDB_editor.pack(fill=tk.BOTH, expand=True, padx=0, pady=0)
+        frame.pack_propagate(False)
 
+    def _build_mapping_preview(self, frame):
         # マッピングプレビューUI
-        try:
-            frame = ttk.Frame(self.notebook)
-            self.notebook.add(frame, text="マッピングプレビューUI")
-            mapping_ui = MappingToolUI(frame, "circus_db.csv", "circus_db_mapping.csv")
-            mapping_ui.pack(fill=tk.BOTH, expand=True)
-            ledger_app.main_frame.pack(fill=tk.BOTH, expand=True)
-        except Exception as e:
-            print("MappingToolUI 起動エラー:", e)
+        from mapping_module import MappingToolUI
+        mapping_ui = MappingToolUI(frame, "circus_db.csv", "circus_db_mapping.csv")
+        mapping_ui.pack(fill=tk.BOTH, expand=True)
 
+    def _build_ledger_creator(self, frame):
         # LedgerCreator（管理台帳作成UI）
-        try:
-            frame = ttk.Frame(self.notebook)
-            self.notebook.add(frame, text="管理台帳作成")
-            ledger_app = LedgerCreatorApp(frame)
-        except Exception as e:
-            print(f"LedgerCreator 起動エラー: {e}")
-            import traceback
-            traceback.print_exc()
+        from ledger_creator import LedgerCreatorApp
+        LedgerCreatorApp(frame)
 
+    def _build_id_generator(self, frame):
         # No_sakusei（ID発行UI）
-        try:
-            frame = ttk.Frame(self.notebook)
-            self.notebook.add(frame, text="ID発行フォーム")
-            id_generator = IdGenerator()
-            InputUI(frame, id_generator)
-        except Exception as e:
-            print("No_sakusei 起動エラー:", e)
+        from No_sakusei_fixed import InputUI, IdGenerator
+        InputUI(frame, IdGenerator())
 
+    def _build_cache_monitor(self, frame):
         # Cacheモニタータブ
-        try:
-            frame = ttk.Frame(self.notebook)
-            self.notebook.add(frame, text="Cacheモニター")
-            CacheMonitorFrame(frame).pack(fill=tk.BOTH, expand=True)
-        except Exception as e:
-            print("CacheMonitor 起動エラー:", e)
+        CacheMonitorFrame(frame, monitor=self.snapshot_monitor).pack(fill=tk.BOTH, expand=True)
 
-        # 起動時にキャッシュスナップショットの差分を監視
-        try:
-            detect_snapshot_anomalies()
-        except Exception as e:
-            print(f"[起動差分監視エラー] {e}")
+    def _log_snapshot_result(self, result):
+        for line in result.lines():
+            print(line)
 
 
-if __name__ == "__main__":
+def build_parser():
+    parser = argparse.ArgumentParser(description="Circus支援ツール")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="import 時間・タブ構築時間などの起動時間レポートを表示する")
+    parser.add_argument("--startup-budget", type=float, default=startup_profiler.STARTUP_BUDGET_SEC,
+                        help="最初のウインドウ表示までの目標秒数（レポートで超過を知らせる）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
     root = tk.Tk()
-    app = CircusSupportTool(root)
-    root.mainloop()
\ No newline at end of file
+    startup_profiler.mark("Tk 初期化")
+    # 計測中は先読みを止める（別スレッドの import が計測結果に混ざらないように）
+    app = CircusSupportTool(root, prewarm=PREWARM_ENABLED and not args.profile_startup)
+    startup_profiler.mark("最初のタブ構築")
+
+    def on_first_window():
+        startup_profiler.mark(startup_profiler.FIRST_WINDOW)
+        startup_profiler.print_report(args.startup_budget)
+
+    if args.profile_startup:
+        root.update_idletasks()
+        root.after_idle(on_first_window)
+    root.mainloop()
+    if args.profile_startup:
+        # 起動後に開いたタブも含めて最後にもう一度表示する
+        startup_profiler.print_report(args.startup_budget)
+    return app
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
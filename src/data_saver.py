@@ -3,8 +3,12 @@
 # 本ファイルは「最終的な保存処理（circus_db.csvへの出力）」を担う
 # キャッシュ操作には一切関与しない（単発保存責務）
 
+import logging
 import pandas as pd
 from datetime import datetime
+import circus_db_store
+import circus_db_journal
+from atomic_writer import atomic_write, file_lock, write_dataframe
 
 REQUIRED_COLUMNS = [
     "企業名", "管理番号", "求人タイトル", "募集予定人数", "仕事内容", "PRポイント",
@@ -14,44 +18,158 @@ REQUIRED_COLUMNS = [
     "支払いサイト", "返戻金規定", "手数料設定_資料"
 ]
 
+# 保存内容の詳細は logging.debug で出す（CLI の --quiet などで標準出力を汚さない）
+logger = logging.getLogger(__name__)
+
 def validate_df_structure(df):
     missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
     if missing:
         raise ValueError(f"circus_db.csv に必要な列が不足しています: {missing}")
 
 def save_circus_db(new_rows_df, circus_db_path="circus_db.csv", metadata=None, overwrite_keys=None):
-    try:
-        df_circus = pd.read_csv(circus_db_path, encoding='utf-8')
-    except FileNotFoundError:
-        df_circus = pd.DataFrame(columns=REQUIRED_COLUMNS)
+    # SQLite / ジャーナルのバックエンドでは (企業名, 管理番号) 単位の UPSERT のみで保存する
+    backend = circus_db_store.CIRCUS_DB_BACKEND
+    if backend in circus_db_store.KEYED_BACKENDS and list(overwrite_keys or circus_db_store.KEY_COLUMNS) == list(circus_db_store.KEY_COLUMNS):
+        validate_df_structure(new_rows_df)
+        records = new_rows_df.to_dict("records")
+        if metadata:
+            for record in records:
+                record.update(metadata)
+        results = circus_db_store.get_store(circus_db_path).upsert_many(records)
+        counts = {key: results.count(key) for key in ('inserted', 'updated', 'unchanged')}
+        logger.debug("%s 保存: 追加 %d 件 / 更新 %d 件 / 変更なし %d 件",
+                     backend, counts['inserted'], counts['updated'], counts['unchanged'])
+        return counts
+    if backend == "sqlite":
+        # SQLite の主キーは (企業名, 管理番号) 固定のため、他のキーでは保存できない（CSV に書くと SQLite に反映されない）
+        raise ValueError(f"SQLite バックエンドでは overwrite_keys に {list(circus_db_store.KEY_COLUMNS)} 以外を指定できません: {list(overwrite_keys)}")
 
     validate_df_structure(new_rows_df)
 
-    for _, new_row in new_rows_df.iterrows():
-        row_copy = new_row.copy()
+    # 読み込み→マージ→書き込みの間は他の保存（別タブ・別プロセス）に割り込ませない
+    lock = circus_db_journal.path_lock(circus_db_path) if backend == "journal" else file_lock(circus_db_path)
+    with lock:
+        if backend == "journal":
+            # キーが既定と異なる場合はログを再生した最新状態から全件を書き直す
+            df_circus = circus_db_journal.read_circus_db(circus_db_path)
+            if df_circus.empty and len(df_circus.columns) == 0:
+                df_circus = pd.DataFrame(columns=REQUIRED_COLUMNS)
+        else:
+            try:
+                df_circus = pd.read_csv(circus_db_path, encoding='utf-8')
+            except FileNotFoundError:
+                df_circus = pd.DataFrame(columns=REQUIRED_COLUMNS)
 
-        if metadata:
-            for key, value in metadata.items():
-                row_copy[key] = value
+        df_circus, counts = merge_circus_rows(df_circus, new_rows_df, metadata=metadata, overwrite_keys=overwrite_keys)
 
-        if overwrite_keys:
-            mask = pd.Series(True, index=df_circus.index)
-            for key in overwrite_keys:
-                mask &= (df_circus[key] == row_copy.get(key, ''))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("保存対象の管理番号頻度:\n%s", new_rows_df[['企業名', '管理番号']].value_counts().head(10))
+            logger.debug("保存後DataFrame先頭:\n%s", df_circus.head())
+        if backend == "journal":
+            circus_db_journal.reset(circus_db_path, df_circus)
         else:
-            mask = (df_circus['企業名'] == row_copy['企業名']) & (df_circus['管理番号'] == row_copy['管理番号'])
-        duplicate_rows = df_circus[mask]
-        duplicate_rows, aligned_row = duplicate_rows.align(row_copy, axis=1, copy=False)
-        if not ((duplicate_rows == aligned_row).all(axis=1).any()):
-            df_circus = df_circus[~mask]
-            df_circus = pd.concat([df_circus, pd.DataFrame([row_copy])], ignore_index=True)
+            write_dataframe(df_circus, circus_db_path, encoding='utf-8')
+    logger.debug("保存後データ行数: %d / 追加 %d 件 / 更新 %d 件 / 変更なし %d 件",
+                 len(df_circus), counts['inserted'], counts['updated'], counts['unchanged'])
+    return counts
+
+
+def _hash_rows(df, columns):
+    """指定列の値から行ハッシュを作る（欠損は空文字、値は文字列として比較）"""
+    normalized = pd.DataFrame(
+        {col: (df[col].fillna("").astype(str) if col in df.columns else "") for col in columns},
+        index=df.index,
+    )
+    return pd.util.hash_pandas_object(normalized, index=False)
+
+
+def merge_circus_rows(df_circus, new_rows_df, metadata=None, overwrite_keys=None, replace_rows=True):
+    """overwrite_keys（既定は 企業名+管理番号）で一括 upsert した DataFrame と件数を返す
+
+    replace_rows=True では、内容が変わった行は既存の同キー行を除いて末尾に追加する（行全体の置き換え）。
+    replace_rows=False では、既存の同キー行のうち new_rows_df にある列だけをその場で書き換える
+    （SQLite / ジャーナルのストアの upsert と同じ。他の列の値は残る）。
+    既存行と内容が同じ行はそのまま残す。同じキーが new_rows_df 内に複数ある場合は後の行が優先される。
+    """
+    keys = list(overwrite_keys) if overwrite_keys else ['企業名', '管理番号']
+    new_rows = new_rows_df.copy()
+    if metadata:
+        for key, value in metadata.items():
+            new_rows[key] = value
+    for key in keys:
+        if key not in new_rows.columns:
+            new_rows[key] = ''
+    new_rows = new_rows.reset_index(drop=True)
+
+    # キーは文字列化して照合する
+    new_key_hash = _hash_rows(new_rows, keys)
+    new_rows = new_rows[~new_key_hash.duplicated(keep='last')]
+    new_key_hash = new_key_hash[new_rows.index]
+
+    existing_key_hash = _hash_rows(df_circus, keys)
+    if not replace_rows:
+        return _update_circus_rows(df_circus, existing_key_hash, new_rows, new_key_hash)
+
+    all_columns = list(dict.fromkeys(list(df_circus.columns) + list(new_rows.columns)))
+    existing_pairs = pd.MultiIndex.from_arrays([existing_key_hash.values, _hash_rows(df_circus, all_columns).values])
+    new_pairs = pd.MultiIndex.from_arrays([new_key_hash.values, _hash_rows(new_rows, all_columns).values])
+
+    unchanged = new_pairs.isin(existing_pairs)
+    existed = new_key_hash.isin(existing_key_hash).values
+    changed_rows = new_rows[~unchanged]
+    changed_key_hash = new_key_hash[~unchanged]
+
+    kept = df_circus[~existing_key_hash.isin(changed_key_hash).values]
+    merged = pd.concat([kept, changed_rows], ignore_index=True) if len(changed_rows) else kept.reset_index(drop=True)
+
+    counts = {
+        'inserted': int((~existed & ~unchanged).sum()),
+        'updated': int((existed & ~unchanged).sum()),
+        'unchanged': int(unchanged.sum()),
+    }
+    return merged, counts
+
+
+def _update_circus_rows(df_circus, existing_key_hash, new_rows, new_key_hash):
+    """merge_circus_rows(replace_rows=False) の本体：new_rows の列だけを既存行に書き込み、無いキーは末尾に追加する"""
+    columns = list(new_rows.columns)
+    # 同じキーの既存行が複数ある場合は、ストアの get と同じく先頭の行と比べる
+    first = pd.Series(existing_key_hash.index, index=existing_key_hash.values)
+    first = first[~first.index.duplicated(keep='first')]
+    existed = new_key_hash.isin(first.index).values
+
+    matched = new_rows[existed]
+    current = df_circus.loc[first[new_key_hash[existed].values].values]
+    differs = pd.Series(False, index=matched.index)
+    for col in columns:
+        new_values = matched[col].fillna("").astype(str).to_numpy()
+        old_values = current[col].fillna("").astype(str).to_numpy() if col in current.columns else ""
+        differs |= new_values != old_values
+    updated_rows = matched[differs.values]
+
+    merged = df_circus.copy()
+    if len(updated_rows):
+        # 更新する列は object にそろえてから書き込む（数値列・欠損だけの列にも文字列を入れられるように）
+        source = pd.Series(range(len(updated_rows)), index=new_key_hash[updated_rows.index].values)
+        targets = existing_key_hash.isin(source.index).values
+        positions = source[existing_key_hash[targets].values].values
+        for col in columns:
+            values = updated_rows[col].to_numpy(dtype=object)[positions]
+            column = merged[col].astype(object) if col in merged.columns else pd.Series(None, index=merged.index, dtype=object)
+            column[targets] = values
+            merged[col] = column
+    inserted_rows = new_rows[~existed]
+    if len(inserted_rows):
+        merged = pd.concat([merged, inserted_rows], ignore_index=True)
+    else:
+        merged = merged.reset_index(drop=True)
 
-    print("[DEBUG] 保存対象の管理番号頻度:")
-    print(new_rows_df[['企業名', '管理番号']].value_counts().head(10))
-    print("[DEBUG] 保存後DataFrame先頭:")
-    print(df_circus.head())
-    df_circus.to_csv(circus_db_path, index=False, encoding='utf-8')
-    print(f"[DEBUG] 保存後データ行数: {len(df_circus)}")
+    counts = {
+        'inserted': int((~existed).sum()),
+        'updated': len(updated_rows),
+        'unchanged': int(existed.sum()) - len(updated_rows),
+    }
+    return merged, counts
 
 
 def save_to_file(mapping_data: dict, path: str = 'circus_db_mapping.csv'):
@@ -69,7 +187,7 @@ def save_to_file(mapping_data: dict, path: str = 'circus_db_mapping.csv'):
     if dir_path:
         os.makedirs(dir_path, exist_ok=True)
 
-    with open(path, mode='w', newline='', encoding='utf-8-sig') as f:
+    with atomic_write(path, encoding='utf-8-sig') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         for row in mapping_data.values():
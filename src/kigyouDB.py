@@ -8,11 +8,13 @@ import pandas as pd
 import csv
 import re
 import pandas as pd
+from atomic_writer import atomic_write
+from read_cache import read_table
 
 def load_company_names(csv_path="企業管理DB.csv"): # インデントを修正
     """企業管理DB.csvから企業名を読み込み、リストとして返す"""
     try:
-        df = pd.read_csv(csv_path, encoding="utf-8")
+        df = read_table(csv_path, copy=False, encoding="utf-8-sig")  # 変更が無ければキャッシュから返す
         company_names = df["企業名"].dropna().unique().tolist()  # 企業名カラムから重複を除いてリスト化
         return company_names
     except FileNotFoundError:
@@ -25,7 +27,7 @@ def load_company_names(csv_path="企業管理DB.csv"): # インデントを修
 def get_company_info(company_name, csv_path="企業管理DB.csv"):
     """企業管理DB.csv から指定された企業名の情報を取得"""
     try:
-        df = pd.read_csv(csv_path, encoding="utf-8")
+        df = read_table(csv_path, copy=False, encoding="utf-8-sig")  # ペーストのたびに再パースしない
         
         matching_rows = df[df["企業名"].str.strip() == company_name.strip()]
         
@@ -273,7 +275,7 @@ def save_to_csv(file_name, data_list, headers):
 
     # ... (CSV ファイルへの保存処理は省略) ...
     try:
-        with open(file_name, mode="w", encoding="utf-8-sig", newline="") as file:
+        with atomic_write(file_name, encoding="utf-8-sig") as file:
             writer = csv.DictWriter(file, fieldnames=headers)
             writer.writeheader()
             writer.writerows(data_list)
@@ -1,45 +1,183 @@
 from data_saver import save_to_file
 import csv
+import threading
 from collections import OrderedDict
 
+def _entry_key(company_name, management_number):
+    return (company_name or '', management_number or '')
+
+def _row_key(row):
+    return _entry_key(row.get('企業名'), row.get('管理番号の文字列'))
+
 class MappingCacheController:
 
     def __init__(self):
         self.mapping_cache = OrderedDict()
         self.next_no = 1
         self.mapping_file_path = 'circus_db_mapping.csv'
+        # (企業名, 管理番号の文字列) -> {No.: None}（順序付き集合、先頭が代表）の索引
+        # load / upsert / delete で常に同期させる。同じキーの行が複数あっても更新は O(1)
+        self._key_index = {}
+        # 更新回数と、更新を知らせる関数（スナップショットの自動保存などが使う）
+        self.revision = 0
+        self._change_listeners = []
+        # コピーオンライト：freeze() で渡した dict / 行は書き換えず、次の更新時に複製してから書く
+        self._lock = threading.Lock()
+        self._shared = False
+        self._owned_rows = set()
 
     def load_from_file(self, path=None):
         path = path or self.mapping_file_path
-        self.mapping_cache.clear()
-        try:
-            with open(path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    no = int(row.get('No.', self.next_no))
-                    self.mapping_cache[no] = row
-                    self.next_no = max(self.next_no, no + 1)
-        except FileNotFoundError:
-            pass
+        with self._lock:
+            self.mapping_cache = OrderedDict()
+            self._shared = False
+            self._owned_rows = set()
+            self._key_index.clear()
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as csvfile:
+                    reader = csv.DictReader(csvfile)
+                    for row in reader:
+                        # 保存のたびに見出しへ BOM が重なっていた過去のファイルにも対応する
+                        row = {key.lstrip('\ufeff'): value for key, value in row.items()}
+                        no = int(row.get('No.') or self.next_no)
+                        self.mapping_cache[no] = row
+                        self._owned_rows.add(no)
+                        self._index_entry(no, row)
+                        self.next_no = max(self.next_no, no + 1)
+            except FileNotFoundError:
+                pass
 
     def save_to_file(self):
         save_to_file(self.mapping_cache)
 
+    # === 変更通知・コピーオンライト ===
+    def add_change_listener(self, callback):
+        """更新のたびに callback(revision) を呼ぶ（更新したスレッドで呼ばれる）"""
+        self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+
+    def freeze(self):
+        """現在の内容を (dict, revision) で返す。返した dict と行はこの後も変わらない"""
+        with self._lock:
+            self._shared = True
+            self._owned_rows = set()
+            return self.mapping_cache, self.revision
+
+    def _writable_cache(self):
+        if self._shared:
+            self.mapping_cache = OrderedDict(self.mapping_cache)
+            self._shared = False
+        return self.mapping_cache
+
+    def _writable_row(self, no):
+        cache = self._writable_cache()
+        if no not in self._owned_rows:
+            cache[no] = dict(cache[no])
+            self._owned_rows.add(no)
+        return cache[no]
+
+    def _put_row(self, no, row):
+        self._writable_cache()[no] = row
+        self._owned_rows.add(no)
+
+    def _changed(self):
+        self.revision += 1
+        for callback in list(self._change_listeners):
+            try:
+                callback(self.revision)
+            except Exception as e:
+                print(f"[cache] 変更通知エラー: {e}")
+
+    # === 索引 ===
+    def _index_entry(self, no, row):
+        if row.get('企業名') or row.get('管理番号の文字列'):
+            self._key_index.setdefault(_row_key(row), {})[no] = None
+
+    def _unindex_entry(self, no):
+        row = self.mapping_cache.get(no)
+        if row is None:
+            return
+        key = _row_key(row)
+        nos = self._key_index.get(key)
+        if nos is not None:
+            # 同じキーの行が他にもあれば、残りの先頭がそのまま代表になる
+            nos.pop(no, None)
+            if not nos:
+                del self._key_index[key]
+
+    def find_no(self, company_name, management_number):
+        """(企業名, 管理番号の文字列) の No. を返す（無ければ None）"""
+        nos = self._key_index.get(_entry_key(company_name, management_number))
+        return next(iter(nos)) if nos else None
+
+    # === 更新 ===
+    def create_entry(self, company_name, management_number):
+        """新しい No. でキーだけの行を作り、その No. を返す"""
+        with self._lock:
+            no = self.next_no
+            self.next_no += 1
+            self._put_row(no, {'No.': no, '企業名': company_name, '管理番号の文字列': management_number})
+            self._index_entry(no, self.mapping_cache[no])
+        self._changed()
+        return no
+
     def upsert_entry(self, company_name, management_number, data_dict):
-        for no, row in self.mapping_cache.items():
-            if row.get('企業名') == company_name and row.get('管理番号') == management_number:
-                self.mapping_cache[no] = data_dict
-                return no
-        new_no = self.next_no
-        self.mapping_cache[new_no] = data_dict
-        self.next_no += 1
-        return new_no
+        with self._lock:
+            no = self.find_no(company_name, management_number)
+            if no is None:
+                no = self.next_no
+                self.next_no += 1
+            data_dict.setdefault('企業名', company_name)
+            data_dict.setdefault('管理番号の文字列', management_number)
+            current = self.mapping_cache.get(no)
+            if current is not None and _row_key(current) == _row_key(data_dict):
+                # キーが変わらない更新では索引に触れない
+                self._put_row(no, data_dict)
+            else:
+                self._unindex_entry(no)
+                self._put_row(no, data_dict)
+                self._index_entry(no, data_dict)
+        self._changed()
+        return no
+
+    def ensure_entry(self, no):
+        """No. の行を返す（無ければ空の行を作る）。返した行は読み取り専用として扱う"""
+        if no not in self.mapping_cache:
+            with self._lock:
+                self._put_row(no, {})
+                self.next_no = max(self.next_no, no + 1)
+            self._changed()
+        return self.mapping_cache[no]
+
+    def set_field(self, no, column_name, value):
+        self.ensure_entry(no)
+        with self._lock:
+            row = self._writable_row(no)
+            if column_name in ('企業名', '管理番号の文字列'):
+                self._unindex_entry(no)
+                row[column_name] = value
+                self._index_entry(no, row)
+            else:
+                row[column_name] = value
+        self._changed()
+
+    def delete_entry(self, no):
+        if no not in self.mapping_cache:
+            return False
+        with self._lock:
+            self._unindex_entry(no)
+            del self._writable_cache()[no]
+            self._owned_rows.discard(no)
+        self._changed()
+        return True
 
+    # === 参照 ===
     def get_by_company_and_number(self, company_name, management_number):
-        for row in self.mapping_cache.values():
-            if row.get('企業名') == company_name and row.get('管理番号') == management_number:
-                return row
-        return None
+        no = self.find_no(company_name, management_number)
+        return self.mapping_cache.get(no) if no is not None else None
 
     def get_all(self):
-        return list(self.mapping_cache.values())
\ No newline at end of file
+        return list(self.mapping_cache.values())
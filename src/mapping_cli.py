@@ -0,0 +1,85 @@
+# === このファイルの責務（GPT用構造補助） ===
+# mapping_cli.py：
+# GUI を使わずにマッピングを実行するコマンドライン入口（cron / Colab / CI 向け）
+#   python -m mapping_cli 日研トータルソーシング          … 1 社
+#   python -m mapping_cli A社 B社 --workers 2             … 複数社
+#   python -m mapping_cli --all --dry-run                 … data/ の全社を保存せずに差分だけ表示
+# 終了コード: 0 = 成功 / 1 = 一部の企業でエラー / 2 = 対象なし・引数やルール・入力の不備 / 3 = 保存に失敗
+
+import argparse
+import os
+import sys
+
+import batch_mapping
+import mapping_diff
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_SAVE_FAILED = 3
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="mapping_cli", description="企業db をマッピングして circus_db に保存する")
+    parser.add_argument("companies", nargs="*", help="対象の企業名（data/{企業名}_db.csv）")
+    parser.add_argument("--all", action="store_true", help="data/ 内の全企業を対象にする")
+    parser.add_argument("--data-dir", default=batch_mapping.DATA_DIR, help="企業db のフォルダ")
+    parser.add_argument("--mapping", default=batch_mapping.MAPPING_FILE, help="マッピングルールのファイル")
+    parser.add_argument("--circus-db", default=batch_mapping.CIRCUS_DB_FILE, help="保存先の circus_db")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（1 で直列）")
+    parser.add_argument("--dry-run", action="store_true", help="保存せずに追加・更新件数だけを表示する")
+    parser.add_argument("--quiet", action="store_true", help="企業ごとの進捗を表示しない")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.companies and not args.all:
+        print("[mapping_cli] 企業名を指定するか --all を付けてください。", file=sys.stderr)
+        return EXIT_USAGE
+
+    company_names = None if args.all else args.companies
+    files = batch_mapping.list_company_files(args.data_dir, company_names)
+    missing = [path for path in files if not os.path.exists(path)]
+    if not files or missing:
+        for path in missing:
+            print(f"[mapping_cli] 企業db が見つかりません: {path}", file=sys.stderr)
+        if not files:
+            print(f"[mapping_cli] 対象の企業db がありません: {args.data_dir}", file=sys.stderr)
+        return EXIT_USAGE
+
+    progress = (lambda message: None) if args.quiet else print
+    try:
+        result = batch_mapping.run_batch(
+            data_dir=args.data_dir,
+            mapping_path=args.mapping,
+            circus_db_path=args.circus_db,
+            company_names=company_names,
+            max_workers=args.workers,
+            save=not args.dry_run,
+            progress=progress,
+        )
+    except ValueError as e:
+        # 必要な列が無いなど、ルールや企業db の内容の問題（書き込みは行われていない）
+        print(f"[mapping_cli] ルールまたは入力データが不正です: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    except OSError as e:
+        print(f"[mapping_cli] 保存に失敗しました: {e}", file=sys.stderr)
+        return EXIT_SAVE_FAILED
+
+    if args.dry_run:
+        if result["rows"] is not None:
+            print(f"[mapping_cli] ドライラン: {mapping_diff.diff_rows(result['rows'], args.circus_db).summary()}")
+        else:
+            print("[mapping_cli] ドライラン: 対象行はありません。")
+    elif result["counts"] is not None:
+        counts = result["counts"]
+        print(f"[mapping_cli] 追加 {counts['inserted']} 件 / 更新 {counts['updated']} 件 / 変更なし {counts['unchanged']} 件")
+
+    for company_name, error in result["errors"].items():
+        print(f"[mapping_cli] {company_name}: {error}", file=sys.stderr)
+    return EXIT_PARTIAL if result["errors"] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
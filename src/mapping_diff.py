@@ -0,0 +1,117 @@
+# === このファイルの責務（GPT用構造補助） ===
+# mapping_diff.py：
+# マッピング結果（描画済みの行）を現在の circus_db と (企業名, 管理番号) で突き合わせ、
+# 保存した場合に「追加・更新・変更なし」が何件になるか、列ごとの変更件数と差分の例を返す
+# 書き込みは一切行わない（ドライラン専用）
+
+import threading
+import numpy as np
+import pandas as pd
+
+import circus_db_store
+from read_cache import read_table
+
+KEYS = list(circus_db_store.KEY_COLUMNS)
+SAMPLE_SIZE = 10
+
+_indexed = {}  # パス -> (シグネチャ, キーで索引した DataFrame)
+_indexed_lock = threading.Lock()
+
+
+class MappingDiff:
+    """ドライランの結果"""
+
+    def __init__(self, inserted, updated, unchanged, field_changes, samples):
+        self.inserted = inserted
+        self.updated = updated
+        self.unchanged = unchanged
+        self.field_changes = field_changes  # 列名 -> 変更される行数（変更の多い順）
+        self.samples = samples              # [(管理番号, 列名, 現在の値, 新しい値), ...]
+
+    @property
+    def counts(self):
+        return {"inserted": self.inserted, "updated": self.updated, "unchanged": self.unchanged}
+
+    def summary(self, max_fields=5):
+        """プレビュー表示用の要約文字列"""
+        lines = [f"追加 {self.inserted} 件 / 更新 {self.updated} 件 / 変更なし {self.unchanged} 件"]
+        if self.field_changes:
+            fields = list(self.field_changes.items())[:max_fields]
+            lines.append("変更される列: " + "、".join(f"{col}({count})" for col, count in fields))
+        return "\n".join(lines)
+
+
+def _normalize(values):
+    """保存時（merge_circus_rows）と同じく、欠損は空文字・値は文字列として比較する"""
+    return values.fillna("").astype(str).reset_index(drop=True)
+
+
+def _index_by_key(df):
+    for key in KEYS:
+        if key not in df.columns:
+            df = df.assign(**{key: ""})
+    index = pd.MultiIndex.from_arrays([df[key].astype(str).str.strip() for key in KEYS], names=KEYS)
+    indexed = df.set_axis(index, axis=0)
+    # 同じキーが複数ある場合はストアの get と同じく先頭の行を現在値とみなす
+    return indexed[~indexed.index.duplicated(keep="first")]
+
+
+def load_indexed_circus(circus_db_path=circus_db_store.CIRCUS_DB_FILE):
+    """現在の circus_db を (企業名, 管理番号) で索引した DataFrame を返す"""
+    if circus_db_store.CIRCUS_DB_BACKEND in circus_db_store.KEYED_BACKENDS:
+        # SQLite / ジャーナルはストアが最新状態を持っている
+        return _index_by_key(circus_db_store.get_store(circus_db_path).to_frame())
+
+    # CSV はファイルが変わるまで索引を使い回す
+    signature = circus_db_store.file_signature(circus_db_path)
+    with _indexed_lock:
+        cached = _indexed.get(circus_db_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    if signature is None:
+        df = pd.DataFrame(columns=KEYS)
+    else:
+        df = read_table(circus_db_path, copy=False, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    indexed = _index_by_key(df)
+    with _indexed_lock:
+        _indexed[circus_db_path] = (signature, indexed)
+    return indexed
+
+
+def diff_rows(new_rows_df, circus_db_path=circus_db_store.CIRCUS_DB_FILE, sample_size=SAMPLE_SIZE):
+    """new_rows_df を保存した場合の差分を返す（同じキーが複数あれば後の行が優先）"""
+    current = load_indexed_circus(circus_db_path)
+    new_rows = new_rows_df.reset_index(drop=True)
+    keys = pd.MultiIndex.from_arrays([new_rows[key].astype(str).str.strip() for key in KEYS], names=KEYS)
+    last = ~keys.duplicated(keep="last")
+    new_rows, keys = new_rows[last].reset_index(drop=True), keys[last]
+
+    existed = keys.isin(current.index)
+    # 列の比較は既存キーの行だけで行う（新規行は比較するまでもなく「追加」）
+    positions = np.flatnonzero(existed)
+    matched = new_rows.iloc[positions]
+    aligned = current.reindex(keys[positions])
+    row_changed = np.zeros(len(positions), dtype=bool)
+    field_changes = {}
+    samples = []
+    numbers = matched["管理番号"].to_numpy(dtype=object)
+    blank = pd.Series("", index=pd.RangeIndex(len(positions)), dtype=object)
+    # どのバックエンドも描画した列だけを書き換えるため、比較も新しい行にある列だけで行う
+    for col in new_rows.columns:
+        if col in KEYS:
+            continue
+        new_values = _normalize(matched[col]) if col in matched.columns else blank
+        old_values = _normalize(aligned[col]) if col in aligned.columns else blank
+        differs = (new_values != old_values).to_numpy(dtype=bool)
+        count = int(differs.sum())
+        if not count:
+            continue
+        field_changes[col] = count
+        row_changed |= differs
+        for i in np.flatnonzero(differs)[:max(sample_size - len(samples), 0)]:
+            samples.append((numbers[i], col, old_values.iat[i], new_values.iat[i]))
+
+    inserted = int((~existed).sum())
+    updated = int(row_changed.sum())
+    field_changes = dict(sorted(field_changes.items(), key=lambda item: -item[1]))
+    return MappingDiff(inserted, updated, len(new_rows) - inserted - updated, field_changes, samples)
@@ -0,0 +1,169 @@
+# === このファイルの責務（GPT用構造補助） ===
+# mapping_engine.py：
+# マッピングの中核処理（ルールの検証・描画・差分・保存）を tkinter に依存せずに提供する
+# GUI（mapping_processor / mapping_module）と CLI（mapping_cli）・バッチ（batch_mapping）から共通で使う
+
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+import circus_db_store
+import mapping_diff
+import mapping_fingerprint
+from atomic_writer import file_lock, write_dataframe
+from data_saver import merge_circus_rows
+from mapping_rule_repository import get_repository
+from read_cache import read_table
+from rule_compiler import compile_rule, compile_template, render_cache_stats  # noqa: F401  描画キャッシュの統計を公開
+
+class MappingError(Exception):
+    """マッピング処理中に発生するエラー"""
+    pass
+
+def validate_rule(rule, company_columns):
+    """ルールが正しく適用できるかを検証する"""
+    company_columns = set(company_columns)
+    for circus_col, company_col_template in rule.items():
+        if company_col_template:
+            compiled = compile_template(company_col_template) if isinstance(company_col_template, str) else None
+            if compiled is not None and compiled.error is not None:
+                raise MappingError(f"ルール '{circus_col}' の形式が正しくありません: {compiled.error}") from compiled.error
+            if compiled is not None and not compiled.row_wise and not compiled.has_format:
+                # 参照列の集合と企業dbの列の差分だけで判定する（テンプレートは解析済みのものを再利用）
+                if compiled.field_set <= company_columns:
+                    continue
+                missing = next(f for f in compiled.fields if f not in company_columns)
+                raise MappingError(f"ルール '{circus_col}' に無効な企業dbカラム '{KeyError(missing)}' が含まれています。")
+            try:
+                company_col_template.format(**{col: "" for col in company_columns})
+            except KeyError as e:
+                raise MappingError(f"ルール '{circus_col}' に無効な企業dbカラム '{e}' が含まれています。") from e
+            except ValueError as e:
+                raise MappingError(f"ルール '{circus_col}' の形式が正しくありません: {e}") from e
+
+def apply_rule(company_row, rule, for_preview=False):
+    """ルールを適用して新しいCircusDBのデータ行を生成する"""
+    new_circus_row = {}
+    for circus_col, company_col_template in rule.items():
+        if company_col_template:
+            try:
+                new_circus_row[circus_col] = company_col_template.format(**company_row)
+            except KeyError as e:
+                if for_preview:
+                    new_circus_row[circus_col] = ""
+                else:
+                    raise MappingError(f"企業db.csv に '{e.args[0]}' カラムが存在しません。") from e  # KeyErrorが発生した場合、エラーメッセージにカラム名を含める
+            
+        else:
+            new_circus_row[circus_col] = ""
+    return new_circus_row
+
+def _missing_column_error(column):
+    return MappingError(f"企業db.csv に '{column}' カラムが存在しません。")
+
+def apply_rule_frame(df_company, rule, for_preview=False):
+    """ルールを企業dbの全行に列単位でまとめて適用する（出力・エラーは apply_rule と同じ）"""
+    return compile_rule(rule).render_frame(df_company, for_preview, missing_error=_missing_column_error)
+
+def load_mapping_rules(mapping_path, company_name, management_number):
+    """マッピングルールを読み込む（共有リポジトリから取得し、ファイルが変わったときだけ読み直す）"""
+    repository = get_repository(mapping_path)
+    if not repository.exists():
+        raise MappingError(f"マッピングルールファイルが見つかりません: {mapping_path}")
+    try:
+        return repository.rules_for(company_name, management_number)
+    except Exception as e:
+        raise MappingError(f"マッピングルールの読み込み中にエラーが発生しました: {e}") from e  # MappingErrorでラップして再送出
+
+def select_target_rows(df_company, management_number):
+    """管理番号に「管理番号の文字列」を含む行を抽出する"""
+    return df_company[df_company['管理番号'].map(lambda value: management_number in str(value))]
+
+def render_circus_rows(target, company_name, rule):
+    """対象行にルールを適用して circus_db の行を作る（テンプレートは一度だけ解析して列単位で描画する）"""
+    new_circus_rows = apply_rule_frame(target, rule)
+    new_circus_rows['企業名'] = company_name
+    new_circus_rows['管理番号'] = target['管理番号'].to_numpy(dtype=object)
+    return new_circus_rows
+
+def fingerprint_mask(company_name, target, rule, circus_db_path="circus_db.csv", force=False):
+    """指紋から再マッピングが必要な行を求め、(bool 配列, 指紋テーブル, source ハッシュ, ルールのハッシュ, 出力列) を返す"""
+    fingerprints = mapping_fingerprint.get_table(circus_db_path)
+    rule_hash = mapping_fingerprint.rule_version(rule)
+    hashes = mapping_fingerprint.source_hashes(target, rule)
+    columns = mapping_fingerprint.output_columns(rule)
+    if force:
+        changed = np.ones(len(target), dtype=bool)
+    else:
+        # circus_db 側の行が前回書き込んだ内容のままかも確かめる（復元・手編集後は再マッピングする）
+        stored = mapping_fingerprint.stored_output_hashes(
+            mapping_diff.load_indexed_circus(circus_db_path), company_name, target['管理番号'], columns)
+        changed = fingerprints.changed_mask(company_name, target['管理番号'], hashes, rule_hash, stored)
+    return changed, fingerprints, hashes, rule_hash, columns
+
+def dry_run_mapping(company_name, management_number, rule, company_db_path, circus_db_path="circus_db.csv", force=False):
+    """保存せずにマッピングを描画し、現在の circus_db との差分（mapping_diff.MappingDiff）を返す
+
+    execute_mapping と同じく、指紋が前回と同じ行は描画せず「変更なし」に数える。
+    """
+    try:
+        df_company = read_table(company_db_path, copy=False, encoding="utf-8-sig")
+        validate_rule(rule, df_company.columns)
+        target = select_target_rows(df_company, management_number)
+        changed = fingerprint_mask(company_name, target, rule, circus_db_path, force)[0]
+        diff = mapping_diff.diff_rows(render_circus_rows(target[changed], company_name, rule), circus_db_path)
+        diff.unchanged += int((~changed).sum())
+        return diff
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        raise MappingError(f"マッピング中にエラーが発生しました: {e}") from e
+
+def execute_mapping(company_name, management_number, rule, company_db_path, force=False):
+    """マッピング処理を実行（前回から参照列・ルールが変わっていない行は飛ばす。force=True で全行）"""
+    try:
+        df_company = read_table(company_db_path, copy=False, encoding="utf-8-sig")
+        validate_rule(rule, df_company.columns) 
+
+        use_store = circus_db_store.CIRCUS_DB_BACKEND in circus_db_store.KEYED_BACKENDS
+        # CSV では読み込み→マージ→書き込みの全体をロックし、他の保存と交互に上書きし合わないようにする
+        with (nullcontext() if use_store else file_lock("circus_db.csv")):
+            return _execute_mapping(company_name, management_number, rule, df_company, use_store, force)
+
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        raise MappingError(f"マッピング中にエラーが発生しました: {e}") from e  # MappingErrorでラップして再送出
+
+def _execute_mapping(company_name, management_number, rule, df_company, use_store, force):
+    """execute_mapping の本体（CSV ではロックを保持した状態で呼ばれる）"""
+    if use_store:
+        df_circus = None
+    else:
+        try:
+            df_circus = pd.read_csv("circus_db.csv", encoding="utf-8-sig")
+        except FileNotFoundError:
+            df_circus = pd.DataFrame(columns=list(circus_db_store.KEY_COLUMNS))
+
+    # 対象行を一括で抽出し、指紋が変わった行だけを描画する
+    target = select_target_rows(df_company, management_number)
+    changed, fingerprints, hashes, rule_hash, columns = fingerprint_mask(company_name, target, rule, "circus_db.csv", force)
+    target, hashes = target[changed], hashes[changed]
+
+    new_circus_rows = render_circus_rows(target, company_name, rule)
+    processed_count = len(new_circus_rows)
+
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': int((~changed).sum())}
+    if processed_count:
+        # 描画結果をまとめて (企業名, 管理番号) 単位で 1 回だけ upsert する（再実行しても行は増えない）
+        if use_store:
+            results = circus_db_store.get_store("circus_db.csv").upsert_many(new_circus_rows.to_dict("records"))
+            saved = {key: results.count(key) for key in ('inserted', 'updated', 'unchanged')}
+        else:
+            # ルールが描画した列だけを書き換え、手入力の列（Circus URL など）は残す（キー付きストアと同じ）
+            df_circus, saved = merge_circus_rows(df_circus, new_circus_rows, replace_rows=False)
+            if saved['inserted'] or saved['updated']:
+                write_dataframe(df_circus, "circus_db.csv", encoding="utf-8-sig")
+        counts = {key: counts[key] + saved[key] for key in counts}
+        fingerprints.update(company_name, target['管理番号'], hashes, rule_hash,
+                            mapping_fingerprint.output_hashes(new_circus_rows, columns))
+        fingerprints.save()
+    print(f"{processed_count} 件のデータをマッピングしました"
+          f"（追加 {counts['inserted']} 件 / 更新 {counts['updated']} 件 / 変更なし {counts['unchanged']} 件）。")
+    return counts
@@ -0,0 +1,160 @@
+# === このファイルの責務（GPT用構造補助） ===
+# mapping_fingerprint.py：
+# 差分マッピング用の指紋テーブル（<circus_db>.fingerprints.csv）を扱う
+# 保存先の circus_db ごとに、(企業名, 管理番号) の「ルールが参照する企業db列のハッシュ」「ルールのハッシュ」
+# 「書き込んだ行（出力列）のハッシュ」を保存し、前回のマッピングから変わっていない行を再描画・再保存せずに済ませる
+# circus_db の行が復元・編集などで書き込んだ内容と違っていれば、その行は指紋があっても再マッピングする
+
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+from atomic_writer import file_lock, write_dataframe
+from circus_db_store import CIRCUS_DB_FILE, KEY_COLUMNS, file_signature, make_key
+from read_cache import read_table
+from rule_compiler import compile_rule
+
+FINGERPRINT_SUFFIX = ".fingerprints.csv"
+FINGERPRINT_COLUMNS = ["circus_db", "企業名", "管理番号", "source_hash", "rule_hash", "output_hash"]
+
+
+def fingerprint_path(circus_db_path):
+    """circus_db ごとの指紋テーブルのパス（circus_db と同じフォルダに置く）"""
+    return os.path.abspath(circus_db_path) + FINGERPRINT_SUFFIX
+
+
+def rule_version(rule):
+    """ルール（出力列 → テンプレート）の内容から版ハッシュを作る"""
+    payload = json.dumps(rule, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def source_hashes(df_company, rule):
+    """各行について、ルールが参照する列の値だけから作ったハッシュ（文字列）を返す"""
+    compiled = compile_rule(rule)
+    if any(t.row_wise for t in compiled.templates.values()):
+        fields = list(df_company.columns)  # 参照列を特定できないテンプレートは行全体を見る
+    else:
+        fields = [f for f in compiled.fields if f in df_company.columns]
+    if not fields:
+        return np.full(len(df_company), "0", dtype=object)
+    values = df_company[fields].fillna("").astype(str)
+    return pd.util.hash_pandas_object(values, index=False).astype(str).to_numpy(dtype=object)
+
+
+def output_columns(rule):
+    """ルールが書き込む circus_db の列（キー列を除く）"""
+    return [col for col in rule if col not in KEY_COLUMNS]
+
+
+def output_hashes(rows, columns):
+    """circus_db の行（描画結果・保存済みの行）について、出力列の値だけから作ったハッシュを返す"""
+    values = pd.DataFrame(
+        {col: (rows[col].fillna("").astype(str) if col in rows.columns else "") for col in columns},
+        index=rows.index,
+    )
+    return pd.util.hash_pandas_object(values, index=False).astype(str).to_numpy(dtype=object)
+
+
+def stored_output_hashes(indexed_circus, company_name, management_numbers, columns):
+    """(企業名, 管理番号) で索引した現在の circus_db から、各行の出力列のハッシュを返す（行が無ければ None）"""
+    numbers = [make_key(company_name, number)[1] for number in management_numbers]
+    keys = pd.MultiIndex.from_arrays([[str(company_name).strip()] * len(numbers), numbers])
+    present = keys.isin(indexed_circus.index)
+    result = np.full(len(numbers), None, dtype=object)
+    if present.any():
+        rows = indexed_circus.loc[keys[present]]
+        result[present] = output_hashes(rows, columns)
+    return result
+
+
+class FingerprintTable:
+    """circus_db 1 つ分の (企業名, 管理番号) → (source_hash, rule_hash, output_hash) の表
+
+    ファイルが他のプロセスなどで書き換えられていれば読み直す。
+    """
+
+    def __init__(self, circus_db_path=CIRCUS_DB_FILE):
+        self.circus_db = os.path.abspath(circus_db_path)
+        self.path = fingerprint_path(circus_db_path)
+        self._entries = {}
+        self._dirty = {}  # 未保存の変更（キー -> 値、削除は None）
+        self._signature = None
+        self._lock = threading.RLock()
+        self._refresh()
+
+    def _refresh(self):
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+        entries = {}
+        if signature is not None:
+            df = read_table(self.path, copy=False, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+            if list(df.columns) == FINGERPRINT_COLUMNS:
+                for circus_db, company, number, source_hash, rule_hash, output_hash in df.itertuples(index=False):
+                    if circus_db == self.circus_db:
+                        entries[make_key(company, number)] = (source_hash, rule_hash, output_hash)
+        # 読み直しても未保存の変更は失わない
+        for key, value in self._dirty.items():
+            if value is None:
+                entries.pop(key, None)
+            else:
+                entries[key] = value
+        self._entries = entries
+        self._signature = signature
+
+    def changed_mask(self, company_name, management_numbers, hashes, rule_hash, stored_hashes):
+        """前回と指紋が異なる（未登録・circus_db の行が消えた／書き換えられた）行を True とする bool 配列を返す
+
+        stored_hashes は現在の circus_db の行の出力ハッシュ（stored_output_hashes の結果）。
+        """
+        with self._lock:
+            self._refresh()
+            entries = self._entries
+            mask = []
+            for number, source_hash, stored in zip(management_numbers, hashes, stored_hashes):
+                entry = entries.get(make_key(company_name, number))
+                mask.append(stored is None or entry != (source_hash, rule_hash, stored))
+            return np.array(mask, dtype=bool)
+
+    def update(self, company_name, management_numbers, hashes, rule_hash, result_hashes):
+        with self._lock:
+            for number, source_hash, output_hash in zip(management_numbers, hashes, result_hashes):
+                key = make_key(company_name, number)
+                self._entries[key] = self._dirty[key] = (source_hash, rule_hash, output_hash)
+
+    def forget(self, company_name=None):
+        """指紋を破棄する（企業名指定時はその企業のみ）。次回は全行を再マッピングする"""
+        with self._lock:
+            self._refresh()
+            company_name = None if company_name is None else str(company_name).strip()
+            for key in [k for k in self._entries if company_name is None or k[0] == company_name]:
+                del self._entries[key]
+                self._dirty[key] = None
+
+    def save(self):
+        with self._lock, file_lock(self.path):
+            # 他で保存された分を読み込んでから、未保存の変更を重ねて書く
+            self._refresh()
+            rows = [(self.circus_db, c, n, s, r, o) for (c, n), (s, r, o) in self._entries.items()]
+            df = pd.DataFrame(rows, columns=FINGERPRINT_COLUMNS)
+            write_dataframe(df, self.path, encoding="utf-8-sig")
+            self._dirty = {}
+            self._signature = file_signature(self.path)
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(circus_db_path=CIRCUS_DB_FILE):
+    """circus_db ごとに共有される指紋テーブルを返す"""
+    key = os.path.abspath(circus_db_path)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None:
+            table = _tables[key] = FingerprintTable(circus_db_path)
+        return table
@@ -3,46 +3,44 @@
 # 保存処理は mapping_processor.py 内で行われ、本モジュールは保存機能を持たない
 
 import pandas as pd
-import csv
 import os
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import sys
 from mapping_processor import execute_mapping_with_rules
 import mapping_processor
+from read_cache import read_table
+from mapping_rule_repository import get_repository
 
 # circusDB_viewer_edit.py ファイルのパスを追加
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-def apply_mapping(company_db_path, mapping_path):
-    """企業db.csv をマッピングしてデータを返す（保存しない）"""
+def apply_mapping(company_db_path, mapping_path, *, company_name=None):
+    """企業db.csv をマッピングしてデータを返す（保存しない）
+
+    各行の管理番号に前方一致する「管理番号の文字列」のルールを適用する（複数一致時はファイル上で先のルール）。
+    company_name を省略した場合は企業db.csv の「企業名」列でルールを絞り込む。
+    """
     try:
-        df_company = pd.read_csv(company_db_path, encoding="utf-8-sig")
-        with open(mapping_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            mapping_data = list(reader)
-
-        mapped_rows = []
-        for _, row in df_company.iterrows():
-            rules = [
-                rule for rule in mapping_data
-                if rule['企業名'] == row['企業名'] and row['管理番号の文字列'] and row['管理番号'].startswith(rule['管理番号の文字列'])
-            ]
-            if rules:
-                rule = rules[0]
-                new_data = {}
-                for circus_col in rule:
-                    company_col_template = rule.get(circus_col)
-                    if company_col_template:
-                        try:
-                            new_data[circus_col] = company_col_template.format(**row)
-                        except KeyError:
-                            new_data[circus_col] = ""
-                    else:
-                        new_data[circus_col] = ""
-                mapped_rows.append(new_data)
-
-        return pd.DataFrame(mapped_rows)
+        df_company = read_table(company_db_path, copy=False, encoding="utf-8-sig")
+        repository = get_repository(mapping_path)
+        if not repository.exists():
+            raise FileNotFoundError(mapping_path)
+        rule_index = repository.rule_index
+        mapping_data = rule_index.rules
+
+        # 全行のルールを索引でまとめて決めてから、ルールごとに列単位で描画する
+        companies = company_name if company_name else df_company['企業名']
+        rule_orders = rule_index.assign(companies, df_company['管理番号'])
+
+        mapped_frames = []
+        for order in pd.unique(rule_orders[rule_orders >= 0]):
+            rows = df_company[rule_orders == order]
+            mapped_frames.append(mapping_processor.apply_rule_frame(rows, mapping_data[order], for_preview=True))
+
+        if not mapped_frames:
+            return pd.DataFrame()
+        return pd.concat(mapped_frames).sort_index().reset_index(drop=True)
     except Exception as e:
         messagebox.showerror("エラー", f"マッピング処理でエラーが発生しました: {e}")
         return pd.DataFrame()
@@ -60,9 +58,8 @@ class MappingToolUI(tk.Frame):
 
     def load_company_data(self):
         try:
-            df = pd.read_csv("企業管理DB.csv", encoding="utf-8-sig")
-            for _, row in df.iterrows():
-                self.company_data[row["企業名"]] = row["識別アルファベット"]
+            df = read_table("企業管理DB.csv", copy=False, encoding="utf-8-sig")
+            self.company_data.update(zip(df["企業名"], df["識別アルファベット"]))
         except FileNotFoundError:
             print("Error: '企業管理DB.csv' が見つかりません。")
         except Exception as e:
@@ -89,7 +86,7 @@ class MappingToolUI(tk.Frame):
         for tab_id in self.preview_notebook.tabs():
             self.preview_notebook.forget(tab_id)
 
-        self.rules = load_mapping_rules(self.mapping_path, company_name, management_number)
+        self.rules = get_repository(self.mapping_path).rules_for(company_name, management_number)
 
         from circusDB_viewer_edit import CircusDB_viewer_edit
 
@@ -97,6 +94,10 @@ class MappingToolUI(tk.Frame):
             tab_frame = tk.Frame(self.preview_notebook)
             self.preview_notebook.add(tab_frame, text=f"ルール {i + 1}")
 
+            # 保存した場合の件数と変更列（ドライラン）をタブの上部に表示する
+            tk.Label(tab_frame, text=self.dry_run_text(company_name, management_number, rule),
+                     justify=tk.LEFT, anchor="w").pack(fill=tk.X, padx=5, pady=(5, 0))
+
             preview_viewer = CircusDB_viewer_edit(tab_frame)
             preview_viewer.pack(fill=tk.BOTH, expand=True)
 
@@ -104,23 +105,27 @@ class MappingToolUI(tk.Frame):
 
         tk.Button(self, text="このルールを保存する", command=self.confirm_rule).grid(row=6, column=0, columnspan=2, pady=10)
 
+    def dry_run_text(self, company_name, management_number, rule):
+        company_db_path = os.path.join("data", f"{company_name}_db.csv")
+        try:
+            diff = mapping_processor.dry_run_mapping(company_name, management_number, rule, company_db_path)
+        except mapping_processor.MappingError as e:
+            return f"ドライラン: {e}"
+        lines = [f"ドライラン: {diff.summary()}"]
+        for number, field, old, new in diff.samples[:3]:
+            lines.append(f"  {number} / {field}: {str(old)[:30]!r} → {str(new)[:30]!r}")
+        return "\n".join(lines)
+
     def set_preview_data(self, preview_viewer, company_name, management_number, rule):
         from circusDB_viewer_edit import CircusDB_viewer_edit
         company_db_file = f"{company_name}_db.csv"
         company_db_path = os.path.join("data", company_db_file)
 
         try:
-            df_company = pd.read_csv(company_db_path, encoding="utf-8-sig")
-
-            preview_data = {}
-            for circus_col, company_col_template in rule.items():
-                if company_col_template:
-                    try:
-                        preview_data[circus_col] = company_col_template.format(**df_company.iloc[0])
-                    except KeyError:
-                        preview_data[circus_col] = ""
-                else:
-                    preview_data[circus_col] = ""
+            df_company = read_table(company_db_path, copy=False, encoding="utf-8-sig")  # ルールごとに再パースしない
+
+            # 先頭行だけをルールで描画する（存在しない列は空欄）
+            preview_data = mapping_processor.apply_rule_frame(df_company.iloc[:1], rule, for_preview=True).iloc[0].to_dict()
 
             for field, value in preview_data.items():
                 if field in preview_viewer.entries:
@@ -160,32 +165,19 @@ class MappingToolUI(tk.Frame):
 
         selected_tab_index = self.preview_notebook.index(self.preview_notebook.select())
 
+        if selected_tab_index < len(self.rules):
+            try:
+                diff = mapping_processor.dry_run_mapping(
+                    company_name, management_number, self.rules[selected_tab_index], company_db_path
+                )
+                if not messagebox.askokcancel("確認", f"このルールを保存します。\n{diff.summary()}"):
+                    return
+            except mapping_processor.MappingError:
+                pass  # エラー内容は実行時に表示する
+
         try:
             mapping_processor.execute_mapping_with_rules(
                 company_name, management_number, self.rules, company_db_path, selected_tab_index
             )
         except mapping_processor.MappingError as e:
             messagebox.showerror("エラー", f"マッピング中にエラーが発生しました: {e}")
-
-def load_mapping_rules(mapping_path, company_name, management_number):
-    mapping_rules = []
-    try:
-        with open(mapping_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['企業名'] == company_name and row['管理番号の文字列'] == management_number:
-                    mapping_rules.append({
-                        col: row[col] for col in reader.fieldnames if col not in ["No.", "企業名", "管理番号の文字列"]
-                    })
-    except FileNotFoundError:
-        print("circus_db_mapping.csv が見つかりません。")
-    except Exception as e:
-        print(f"Error loading mapping rules: {e}")
-    return mapping_rules
-
-# 追加：ルール読み込み関数（mapping_processor側に未定義のため）
-def load_mapping_rules(mapping_path, company_name, management_number):
-    import csv
-    with open(mapping_path, mode='r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        return [row for row in reader if row['企業名'] == company_name and row['管理番号の文字列'] == management_number]
\ No newline at end of file
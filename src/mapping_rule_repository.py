@@ -0,0 +1,117 @@
+# === このファイルの責務（GPT用構造補助） ===
+# mapping_rule_repository.py：
+# circus_db_mapping.csv（マッピングルール）を一度だけ読み込み、企業名・管理番号の文字列で索引して共有する
+# ファイルが変更されたとき（mtime / サイズが変わったとき）だけ読み込み直す
+# MappingTool・MappingToolUI・mapping_processor・batch_mapping はここからルールを取得する
+
+import os
+import logging
+import threading
+
+from circus_db_store import file_signature
+from read_cache import read_table
+from rule_index import PrefixRuleIndex
+
+# 読み込みの状況は logging で出す（mapping_cli --quiet などで標準出力を汚さない）
+logger = logging.getLogger(__name__)
+
+MAPPING_FILE = "circus_db_mapping.csv"
+# ルールの識別用の列（描画対象ではない）
+RULE_KEY_COLUMNS = ["No.", "企業名", "管理番号の文字列"]
+
+
+def rule_body(rule):
+    """ルール行から識別用の列を除いた「出力列 → テンプレート」を返す"""
+    return {col: value for col, value in rule.items() if col not in RULE_KEY_COLUMNS}
+
+
+class MappingRuleRepository:
+    """マッピングルールの読み込み・索引・再読み込みを受け持つ"""
+
+    def __init__(self, path=MAPPING_FILE):
+        self.path = path
+        self._signature = None
+        self._loaded = False
+        self._rows = []
+        self._by_company = {}  # 企業名 -> [ルール行, ...]（ファイル順）
+        self._by_key = {}      # (企業名, 管理番号の文字列) -> [ルール行, ...]
+        self._rule_index = PrefixRuleIndex([])
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """ファイルが変更されていれば読み込み直す。読み込んだ場合 True を返す"""
+        with self._lock:
+            signature = file_signature(self.path)
+            if self._loaded and signature == self._signature:
+                return False
+            self._load(signature is not None)
+            self._signature = signature
+            self._loaded = True
+            return True
+
+    def _load(self, exists):
+        rows = []
+        if exists:
+            df = read_table(self.path, copy=False, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+            # 保存のたびに見出しへ BOM が重なっていた過去のファイルにも対応する
+            df = df.rename(columns=lambda col: col.lstrip("\ufeff"))
+            rows = df.to_dict("records")
+        self._rows = rows
+        self._by_company = {}
+        self._by_key = {}
+        for row in rows:
+            company_name = row.get("企業名", "")
+            self._by_company.setdefault(company_name, []).append(row)
+            self._by_key.setdefault((company_name, row.get("管理番号の文字列", "")), []).append(row)
+        self._rule_index = PrefixRuleIndex(rows)
+        logger.debug("%d 件のルールを読み込みました: %s", len(rows), os.path.basename(self.path))
+
+    def exists(self):
+        return file_signature(self.path) is not None
+
+    # === 参照 ===
+    def rows(self):
+        """全ルール行（識別列を含む）をファイル順で返す"""
+        with self._lock:
+            self.refresh()
+            return list(self._rows)
+
+    def company_rules(self, company_name):
+        """企業名のルール行（識別列を含む）をファイル順で返す"""
+        with self._lock:
+            self.refresh()
+            return list(self._by_company.get(company_name, []))
+
+    def rules_for(self, company_name, management_number, full=False):
+        """(企業名, 管理番号の文字列) のルールを返す（full=False なら識別列を除いた本体のみ）"""
+        with self._lock:
+            self.refresh()
+            rows = self._by_key.get((company_name, management_number), [])
+            return [dict(row) if full else rule_body(row) for row in rows]
+
+    def prefixes(self, company_name):
+        """企業名に登録されている 管理番号の文字列 を登録順で返す"""
+        with self._lock:
+            self.refresh()
+            return list(dict.fromkeys(row.get("管理番号の文字列", "") for row in self._by_company.get(company_name, [])))
+
+    @property
+    def rule_index(self):
+        """全ルールの前方一致索引（rule_index.PrefixRuleIndex）"""
+        with self._lock:
+            self.refresh()
+            return self._rule_index
+
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(path=MAPPING_FILE):
+    """パスごとに共有されるリポジトリを返す"""
+    key = os.path.abspath(path)
+    with _repositories_lock:
+        repository = _repositories.get(key)
+        if repository is None:
+            repository = _repositories[key] = MappingRuleRepository(path)
+        return repository
@@ -3,20 +3,25 @@ from tkinter import messagebox, filedialog
 from tkinter import ttk
 import pandas as pd
 import os
-import csv
-import datetime
 from mapping_cache_controller import MappingCacheController
+from read_cache import read_table
+from mapping_rule_repository import get_repository
+from snapshot_scheduler import SnapshotScheduler
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-os.chdir(BASE_DIR)
 CIRCUS_DB_FILE = os.path.join(BASE_DIR, 'circus_db.csv')
 MAPPING_FILE = os.path.join(BASE_DIR, 'circus_db_mapping.csv')
 BACKUP_DIR = os.path.join(BASE_DIR, 'backup')
-os.makedirs(BACKUP_DIR, exist_ok=True)
+SNAPSHOT_DIR = os.path.join(BASE_DIR, 'cache')
 df_company = None
 
+def prepare_workdir():
+    """作業フォルダをこのファイルのフォルダに合わせ、バックアップ用フォルダを作る（import 時には行わない）"""
+    os.chdir(BASE_DIR)
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+
 def load_company_names(csv_path='企業管理DB.csv'):
     try:
-        df = pd.read_csv(csv_path, encoding='utf-8')
+        df = read_table(csv_path, copy=False, encoding='utf-8-sig')
         return df['企業名'].dropna().unique().tolist()
     except FileNotFoundError:
         return []
@@ -43,30 +48,30 @@ class MappingTool(tk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
-        self.mapping_cache = {}
-        self.next_no = 1
+        prepare_workdir()
         self.cache_controller = MappingCacheController()
         self.cache_controller.load_from_file()
+        # キャッシュの編集内容を一定回数・一定時間ごとに cache/ へ自動スナップショットする
+        self.snapshot_scheduler = SnapshotScheduler(self.cache_controller, cache_dir=SNAPSHOT_DIR)
+        self.snapshot_scheduler.start()
+        self.bind('<Destroy>', self._on_destroy)
         self.create_main_window()
 
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self.snapshot_scheduler.stop(flush=True)
+
     def save_mapping(self):
         company_name = self.company_entry.get()
         management_number = self.management_number_entry.get()
         if not company_name or not management_number:
             messagebox.showerror('エラー', '企業名と管理番号を入力してください。')
             return
-        existing_no = None
-        for no, row in self.cache_controller.mapping_cache.items():
-            if row.get('企業名') == company_name and row.get('管理番号の文字列') == management_number:
-                existing_no = no
-                break
-        if existing_no is not None:
-            no = existing_no
+        no = self.cache_controller.find_no(company_name, management_number)
+        if no is not None:
             messagebox.showinfo('取得', f'既存のデータを取得しました。（No. {no}）')
         else:
-            no = self.next_no
-            self.next_no += 1
-            self.cache_controller.mapping_cache[no] = {'No.': no, '企業名': company_name, '管理番号の文字列': management_number}
+            no = self.cache_controller.create_entry(company_name, management_number)
             messagebox.showinfo('保存', f'企業名と管理番号をキャッシュに保存しました。（No. {no}）')
 
     def save_all(self):
@@ -94,16 +99,11 @@ class MappingTool(tk.Frame):
 
     def update_management_number_list(self, event=None):
         company_name = self.company_entry.get()
-        if not company_name or not os.path.exists(MAPPING_FILE):
+        repository = get_repository(MAPPING_FILE)
+        if not company_name or not repository.exists():
             return
         try:
-            management_numbers = set()
-            with open(MAPPING_FILE, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['企業名'] == company_name:
-                        management_numbers.add(row['管理番号の文字列'])
-            self.management_number_entry['values'] = list(management_numbers) + ['新規入力可']
+            self.management_number_entry['values'] = repository.prefixes(company_name) + ['新規入力可']
         except Exception as e:
             print(f'管理番号更新エラー: {e}')
             messagebox.showerror('エラー', '管理番号リストの更新中にエラーが発生しました。')
@@ -114,10 +114,7 @@ class MappingTool(tk.Frame):
     def get_current_no(self):
         company_name = self.company_entry.get()
         management_number = self.management_number_entry.get()
-        for existing_no, data in self.cache_controller.mapping_cache.items():
-            if data.get('企業名') == company_name and data.get('管理番号の文字列') == management_number:
-                return existing_no
-        return None
+        return self.cache_controller.find_no(company_name, management_number)
 
     def create_blocks(self):
         blocks = {'募集概要': ['求人タイトル', '募集予定人数', '仕事内容', 'PRポイント', '募集概要_資料'], '勤務地・勤務時間': ['勤務地住所', '勤務時間補足', '勤務地・勤務時間_資料'], '給与・賞与': ['年収例', '給与条件補足', '給与・賞与_資料'], '休日・休暇': ['休日休暇補足', '休日・休暇_資料'], '福利厚生・諸手当': ['福利厚生・諸手当', '福利厚生・諸手当_資料'], '求める人材': ['応募時必須条件', '求める人材_資料'], '手数料設定': ['成果報酬金額', '支払いサイト', '返戻金規定', '手数料設定_資料']}
@@ -135,8 +132,7 @@ class MappingTool(tk.Frame):
         if no is None:
             messagebox.showerror('エラー', '企業名と管理番号が未入力、または正しく確定されていません。')
             return
-        if no not in self.cache_controller.mapping_cache:
-            self.cache_controller.mapping_cache[no] = {}
+        entry = self.cache_controller.ensure_entry(no)
         edit_window = tk.Toplevel()
         edit_window.title(f'{column_name} - 文面作成 / 編集')
         edit_window.geometry('700x500')
@@ -145,7 +141,7 @@ class MappingTool(tk.Frame):
         preview_text.pack(padx=10, pady=5, expand=True, fill='both')
         tk.Label(edit_window, text='文面編集:').pack(pady=5)
         edit_text = tk.Text(edit_window, height=10, wrap='word')
-        existing_text = self.cache_controller.mapping_cache[no].get(column_name, '')
+        existing_text = entry.get(column_name, '')
         edit_text.insert('1.0', existing_text)
         edit_text.pack(padx=10, pady=5, expand=True, fill='both')
         self.update_preview(edit_text, preview_text)
@@ -187,10 +183,8 @@ class MappingTool(tk.Frame):
         if correct_no is None:
             messagebox.showerror('エラー', '企業名と管理番号を確定してください。')
             return
-        if correct_no not in self.cache_controller.mapping_cache:
-            self.cache_controller.mapping_cache[correct_no] = {}
         new_text = edit_text.get('1.0', tk.END).strip()
-        self.cache_controller.mapping_cache[correct_no][column_name] = new_text
+        self.cache_controller.set_field(correct_no, column_name, new_text)
         messagebox.showinfo('保存完了', f'{column_name} の内容をキャッシュに保存しました。（No. {correct_no}）')
         self.update_preview(edit_text, preview_text)
         edit_window.destroy()
@@ -7,6 +7,8 @@ import pandas as pd
 import os
 import csv
 import datetime
+from atomic_writer import atomic_write
+from read_cache import read_table
 
 # === 1. 初期設定 & データ管理 ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,7 +23,7 @@ df_company = None  # 企業DBデータのグローバル変数
 def load_company_names(csv_path="企業管理DB.csv"):
     """企業管理DB.csvから企業名を取得"""
     try:
-        df = pd.read_csv(csv_path, encoding="utf-8")
+        df = read_table(csv_path, copy=False, encoding="utf-8-sig")
         return df["企業名"].dropna().unique().tolist()
     except FileNotFoundError:
         return []
@@ -118,7 +120,7 @@ class MappingTool(tk.Frame):
         ]
 
         try:
-            with open(MAPPING_FILE, 'w', encoding='utf-8-sig', newline='') as f:
+            with atomic_write(MAPPING_FILE, encoding='utf-8-sig') as f:
                 writer = csv.DictWriter(f, fieldnames=headers)
                 writer.writeheader()
                 for no, data in sorted(self.mapping_cache.items()):
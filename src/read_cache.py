@@ -0,0 +1,99 @@
+# === このファイルの責務（GPT用構造補助） ===
+# read_cache.py：
+# プロセス全体で共有する CSV 読み込みキャッシュ
+# キーは (絶対パス, read_csv のオプション)、有効性は (mtime_ns, size) で判定する
+# メモリ使用量の上限を超えたら最も古く使われたものから捨てる（LRU）
+
+import os
+import threading
+from collections import OrderedDict
+
+import atomic_writer
+from binary_snapshot import read_csv_with_sidecar
+
+# キャッシュ全体で保持する DataFrame のメモリ上限（バイト）
+MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+
+_cache = OrderedDict()  # (パス, オプション) -> (シグネチャ, DataFrame, バイト数)
+_cache_lock = threading.RLock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _freeze(value):
+    """オプションをキャッシュキーに使える形にする"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, type):
+        return value.__name__
+    return value
+
+
+def read_table(path, copy=True, **opts):
+    """pd.read_csv(path, **opts) の結果をキャッシュ付きで返す
+
+    ファイルが変わっていなければ再パースしない。呼び出し側が結果を書き換えても
+    キャッシュが壊れないよう、既定ではコピーを返す（copy=False で共有参照）。
+    FileNotFoundError などの例外は pd.read_csv と同じく送出する。
+    """
+    abs_path = os.path.abspath(path)
+    key = (abs_path, _freeze(opts))
+    signature = _signature(abs_path)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == signature:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[1].copy() if copy else entry[1]
+        _stats["misses"] += 1
+
+    # 有効な列指向サイドカーがあればそちらを読む（無ければ CSV を読んでサイドカーを作る）
+    df = read_csv_with_sidecar(abs_path, **opts)
+    size = int(df.memory_usage(index=True, deep=True).sum())
+
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _stats["bytes"] -= old[2]
+        if size <= MEMORY_BUDGET_BYTES:
+            _cache[key] = (signature, df, size)
+            _stats["bytes"] += size
+            _evict()
+    return df.copy() if copy else df
+
+
+def _evict():
+    while _stats["bytes"] > MEMORY_BUDGET_BYTES and _cache:
+        _, (_, _, size) = _cache.popitem(last=False)
+        _stats["bytes"] -= size
+        _stats["evictions"] += 1
+
+
+def invalidate(path=None):
+    """path のキャッシュを破棄する（None で全件）"""
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+            _stats["bytes"] = 0
+            return
+        abs_path = os.path.abspath(path)
+        for key in [k for k in _cache if k[0] == abs_path]:
+            _stats["bytes"] -= _cache.pop(key)[2]
+
+
+def get_stats():
+    """ヒット数・ミス数・破棄数・使用バイト数・件数を返す"""
+    with _cache_lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_cache)
+        return stats
+
+
+# 共通書き込み層で保存されたファイルは即座に破棄する（mtime の粒度が粗い環境向け）
+atomic_writer.register_after_write(invalidate)
@@ -0,0 +1,261 @@
+# === このファイルの責務（GPT用構造補助） ===
+# rule_compiler.py：
+# マッピングルールのテンプレート（"{列名}..." 形式）を一度だけ解析し、
+# DataFrame の列単位でまとめて文字列を組み立てる描画関数を作る
+# 出力とエラーは mapping_processor.apply_rule（str.format(**行)）と同じになるようにする
+
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from string import Formatter
+import numpy as np
+import pandas as pd
+
+_formatter = Formatter()
+# str.format と同じく、"." や "[" の手前までを引数名とみなす
+_ARG_NAME = re.compile(r"[^.\[]*")
+# 解析済みテンプレートを保持する件数（テンプレート文字列ごと）
+TEMPLATE_CACHE_SIZE = 4096
+# 描画結果を保持する件数（(テンプレート, 参照列の値) ごと）
+RENDER_CACHE_SIZE = 20000
+
+
+def _factorize_values(values, is_object):
+    """値を番号付けし (番号, 値の一覧) を返す（NaN も 1 つの値として扱う）
+
+    factorize は 1・1.0・True を同じ値とみなすため、object 列で型が混ざる場合は (型, 値) の組で番号を振り直す。
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    if is_object and len(values):
+        type_codes, types = pd.factorize(np.fromiter(map(type, values), dtype=object, count=len(values)))
+        if len(types) > 1:
+            codes = pd.factorize(type_codes * len(uniques) + codes)[0]
+            # 番号ごとに最初に現れた行の値を代表にする
+            first_rows = np.empty(codes.max() + 1, dtype=np.int64)
+            first_rows[codes[::-1]] = np.arange(len(values) - 1, -1, -1)
+            return codes, values[first_rows]
+    return codes, np.asarray(uniques, dtype=object)
+
+
+class RenderCache:
+    """(テンプレート, 参照列の値のタプル) → 描画結果 の LRU"""
+
+    def __init__(self, max_entries=RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0    # 描画を省略できた行数
+        self.misses = 0  # 実際に描画した（値の組み合わせの）件数
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put_many(self, items):
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_render_cache = RenderCache()
+_NA = object()  # キャッシュのキーで欠損値を表す印
+
+
+class CompiledTemplate:
+    """1 つのテンプレートを解析した結果"""
+
+    def __init__(self, template):
+        self.template = template
+        self.parts = []       # (リテラル, 列名 or None, 変換, 書式指定)
+        self.fields = []      # 参照する列名（テンプレート内の出現順、重複なし）
+        self.error = None     # 解析時の ValueError（描画時に送出する）
+        self.row_wise = False  # 属性参照・添字・位置引数などは行単位の str.format に任せる
+        self.has_format = False  # 変換（!r など）や書式指定を含むか
+        try:
+            for literal, field_name, format_spec, conversion in _formatter.parse(template):
+                if field_name is None:
+                    self.parts.append((literal, None, None, None))
+                    continue
+                first = _ARG_NAME.match(field_name).group()
+                rest = field_name[len(first):]
+                if first == "" or first.isdigit() or rest or "{" in (format_spec or ""):
+                    self.row_wise = True
+                else:
+                    if first not in self.fields:
+                        self.fields.append(first)
+                self.parts.append((literal, first, conversion, format_spec))
+                if conversion or format_spec:
+                    self.has_format = True
+        except ValueError as e:
+            self.error = e
+        self.field_set = frozenset(self.fields)
+
+    def render_frame(self, df, for_preview=False, missing_error=KeyError):
+        """df の全行を描画した object 配列を返す
+
+        参照列が無い場合は for_preview なら空文字、そうでなければ missing_error(列名) を送出する。
+        """
+        n = len(df)
+        if not self.template:
+            return np.full(n, "", dtype=object)
+        if n == 0:
+            return np.empty(0, dtype=object)
+        if self.error is not None:
+            raise self.error
+        if self.row_wise:
+            return self._render_row_wise(df, for_preview, missing_error)
+        for field in self.fields:
+            if field not in df.columns:
+                if for_preview:
+                    return np.full(n, "", dtype=object)
+                raise missing_error(field)
+
+        columns = {field: df[field].to_numpy(dtype=object) for field in self.fields}
+        if len(self.parts) == 1 and not self.has_format:
+            return self._render_columns(columns, n)  # "{列名}" だけのテンプレートは値をそのまま使う
+        return self._render_memoized(columns, n, tuple(str(df[field].dtype) for field in self.fields))
+
+    def _render_memoized(self, columns, n, dtypes):
+        """参照列の値の組み合わせごとに一度だけ描画し、結果を LRU に残して再利用する"""
+        # 列ごとに値を番号付けし（NaN も 1 つの値として扱う）、番号の組み合わせで重複を除く
+        field_codes, field_values = [], []
+        for field, dtype in zip(self.fields, dtypes):
+            codes, uniques = _factorize_values(columns[field], dtype == "object")
+            field_codes.append(codes)
+            field_values.append(uniques)
+        inverse = np.zeros(n, dtype=np.int64)
+        for codes, values in zip(field_codes, field_values):
+            # 組み合わせ番号を列ごとに畳み込む（毎回番号を振り直すので桁あふれしない）
+            inverse = pd.factorize(inverse * len(values) + codes)[0]
+        # 組み合わせごとに最初に現れた行から、各列の値の番号を取り出す
+        first_rows = np.empty(inverse.max() + 1, dtype=np.int64)
+        first_rows[inverse[::-1]] = np.arange(n - 1, -1, -1)
+        combos = np.stack([codes[first_rows] for codes in field_codes], axis=1) if self.fields else np.zeros((1, 0), dtype=np.int64)
+        # キャッシュのキーでは NaN を共通の印に置き換え、列と値の型も含める（1・1.0・True は別の描画結果になる）
+        key_values = [
+            [(type(value), key) for value, key in zip(values, np.where(pd.isna(values), _NA, values))] if len(values) else []
+            for values in field_values
+        ]
+
+        rendered = np.empty(len(combos), dtype=object)
+        keys = []
+        missing = []
+        for i, combo in enumerate(combos):
+            key = (self.template, dtypes, tuple(key_values[j][code] for j, code in enumerate(combo)))
+            keys.append(key)
+            value = _render_cache.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                rendered[i] = value
+        if missing:
+            missing_columns = {
+                field: field_values[j][combos[missing, j]] for j, field in enumerate(self.fields)
+            }
+            values = self._render_columns(missing_columns, len(missing))
+            rendered[missing] = values
+            _render_cache.put_many((keys[i], value) for i, value in zip(missing, values))
+        _render_cache.record(n - len(missing), len(missing))
+        return rendered[inverse]
+
+    def _render_columns(self, columns, n):
+        result = np.full(n, "", dtype=object)
+        for literal, field, conversion, format_spec in self.parts:
+            if literal:
+                result = result + literal
+            if field is None:
+                continue
+            values = columns[field]
+            if conversion or format_spec:
+                convert = {"r": repr, "s": str, "a": ascii}.get(conversion, lambda v: v)
+                rendered = np.array([format(convert(v), format_spec) for v in values], dtype=object)
+            elif pd.api.types.infer_dtype(values, skipna=False) == "string":
+                rendered = values
+            else:
+                # format(v, "") は str(v) と同じ（NaN は "nan"）
+                rendered = np.array([v if type(v) is str else str(v) for v in values], dtype=object)
+            result = result + rendered
+        return result
+
+    def _render_row_wise(self, df, for_preview, missing_error):
+        rendered = []
+        for row in df.to_dict("records"):
+            try:
+                rendered.append(self.template.format(**row))
+            except KeyError as e:
+                if not for_preview:
+                    raise missing_error(e.args[0]) from e
+                rendered.append("")
+        return np.array(rendered, dtype=object)
+
+
+class CompiledRule:
+    """ルール（出力列 → テンプレート）全体を解析した結果"""
+
+    def __init__(self, rule):
+        self.columns = list(rule.keys())
+        self.templates = {col: compile_template(template or "") for col, template in rule.items()}
+
+    @property
+    def fields(self):
+        """ルール全体で参照する列名"""
+        fields = []
+        for template in self.templates.values():
+            fields.extend(f for f in template.fields if f not in fields)
+        return fields
+
+    def render_frame(self, df, for_preview=False, missing_error=KeyError):
+        """df の全行にルールを適用した DataFrame（列順はルールの順）を返す"""
+        data = {
+            col: self.templates[col].render_frame(df, for_preview, missing_error)
+            for col in self.columns
+        }
+        return pd.DataFrame(data, index=df.index, columns=self.columns)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(template):
+    """テンプレート文字列ごとに解析結果を共有する（解析結果は読み取り専用として扱う）"""
+    return CompiledTemplate(template)
+
+
+def render_cache_stats():
+    """描画結果キャッシュのヒット数・ミス数・件数・ヒット率を返す"""
+    return _render_cache.stats()
+
+
+def template_cache_info():
+    """テンプレート解析キャッシュのヒット数・ミス数などを返す"""
+    return compile_template.cache_info()
+
+
+def compile_rule(rule):
+    return CompiledRule(rule)
@@ -0,0 +1,78 @@
+# === このファイルの責務（GPT用構造補助） ===
+# rule_index.py：
+# マッピングルールを「企業名ごとの 管理番号の文字列 トライ」に索引化する
+# 管理番号に前方一致するルールを O(管理番号の長さ) で引ける
+# 複数のルールが一致する場合は、従来どおりファイル上で先に現れたルールを返す
+
+import numpy as np
+
+PREFIX_COLUMN = "管理番号の文字列"
+
+
+class _Node:
+    __slots__ = ("children", "rule_order")
+
+    def __init__(self):
+        self.children = {}
+        self.rule_order = None  # このノードで終わる接頭辞のうち最も先に現れたルールの位置
+
+
+class PrefixRuleIndex:
+    """企業名 → 管理番号の文字列 のトライ"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._roots = {}
+        for order, rule in enumerate(self.rules):
+            prefix = rule.get(PREFIX_COLUMN) or ""
+            if not prefix:
+                continue  # 空の接頭辞はどの管理番号にも適用しない
+            node = self._roots.setdefault(rule.get("企業名", ""), _Node())
+            for ch in prefix:
+                node = node.children.setdefault(ch, _Node())
+            if node.rule_order is None:
+                node.rule_order = order
+
+    def match_order(self, company_name, management_number):
+        """一致するルールの位置を返す（無ければ -1）"""
+        node = self._roots.get(company_name)
+        if node is None:
+            return -1
+        best = -1
+        for ch in str(management_number):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.rule_order is not None and (best < 0 or node.rule_order < best):
+                best = node.rule_order
+        return best
+
+    def match(self, company_name, management_number):
+        """一致するルールを返す（無ければ None）"""
+        order = self.match_order(company_name, management_number)
+        return self.rules[order] if order >= 0 else None
+
+    def assign(self, company_names, management_numbers):
+        """各行に一致するルールの位置を配列で返す（一致なしは -1）
+
+        company_names には行ごとの企業名の並び、または全行共通の企業名（文字列）を渡す。
+        """
+        management_numbers = list(management_numbers)
+        if isinstance(company_names, str):
+            company_names = [company_names] * len(management_numbers)
+        memo = {}
+        result = np.empty(len(management_numbers), dtype=np.int64)
+        for i, key in enumerate(zip(company_names, management_numbers)):
+            order = memo.get(key)
+            if order is None:
+                order = memo[key] = self.match_order(*key)
+            result[i] = order
+        return result
+
+    def prefixes(self, company_name):
+        """企業名に登録されている 管理番号の文字列 を登録順で返す"""
+        seen = {}
+        for rule in self.rules:
+            if rule.get("企業名") == company_name:
+                seen.setdefault(rule.get(PREFIX_COLUMN, ""), None)
+        return list(seen)
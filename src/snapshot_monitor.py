@@ -0,0 +1,86 @@
+# === このファイルの責務（GPT用構造補助） ===
+# snapshot_monitor.py：
+# キャッシュスナップショットの差分監視を UI スレッドの外（バックグラウンドスレッド）で行う
+# 結果（cache_snapshot_utils.MonitorResult）はキューに入れ、Tk の after() で UI スレッドに戻してから通知する
+# 一定間隔で自動的に再チェックする（間隔は環境変数 CIRCUS_SNAPSHOT_MONITOR_INTERVAL_SEC で変更、0 で無効）
+
+import os
+import queue
+import threading
+
+DEFAULT_INTERVAL_SEC = int(os.environ.get("CIRCUS_SNAPSHOT_MONITOR_INTERVAL_SEC", "600"))
+POLL_INTERVAL_MS = 100
+
+
+class SnapshotMonitor:
+    """差分監視のスケジューラ。widget には after() を持つ Tk のウィジェット（root など）を渡す"""
+
+    def __init__(self, widget, cache_dir="cache", interval_sec=DEFAULT_INTERVAL_SEC):
+        self.widget = widget
+        self.cache_dir = cache_dir
+        self.interval_sec = interval_sec
+        self.last_result = None
+        self._listeners = []
+        self._results = queue.Queue()
+        self._running = False
+        self._periodic_id = None
+        self._stopped = False
+
+    def add_listener(self, callback):
+        """結果を受け取る関数を登録する（UI スレッドで呼ばれる）。直近の結果があればすぐに渡す"""
+        self._listeners.append(callback)
+        if self.last_result is not None:
+            callback(self.last_result)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def start(self):
+        """初回チェックを始め、以後は interval_sec ごとに再チェックする"""
+        self._stopped = False
+        self.check_now()
+
+    def stop(self):
+        self._stopped = True
+        if self._periodic_id is not None:
+            self.widget.after_cancel(self._periodic_id)
+            self._periodic_id = None
+
+    def check_now(self):
+        """バックグラウンドでチェックを始める。実行中なら何もしない（False を返す）"""
+        if self._running:
+            return False
+        self._running = True
+        if self._periodic_id is not None:
+            self.widget.after_cancel(self._periodic_id)
+            self._periodic_id = None
+        threading.Thread(target=self._worker, name="snapshot-monitor", daemon=True).start()
+        self.widget.after(POLL_INTERVAL_MS, self._poll)
+        return True
+
+    @property
+    def running(self):
+        return self._running
+
+    def _worker(self):
+        # pandas を使う比較処理はここで初めて import する（起動時の import を軽くする）
+        from cache_snapshot_utils import check_snapshots
+        self._results.put(check_snapshots(self.cache_dir))
+
+    def _poll(self):
+        # UI スレッドで結果を受け取り、リスナーに渡す
+        try:
+            result = self._results.get_nowait()
+        except queue.Empty:
+            self.widget.after(POLL_INTERVAL_MS, self._poll)
+            return
+        self._running = False
+        self.last_result = result
+        for callback in list(self._listeners):
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"[monitor] 結果の表示中にエラー: {e}")
+        if not self._stopped and self.interval_sec > 0:
+            self._periodic_id = self.widget.after(self.interval_sec * 1000, self.check_now)
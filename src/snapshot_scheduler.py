@@ -0,0 +1,171 @@
+# === このファイルの責務（GPT用構造補助） ===
+# snapshot_scheduler.py：
+# MappingCacheController の内容を差分スナップショット（snapshot_store、cache/manifests + cache/objects）として自動保存する
+# 「前回の保存から N 回更新された」か「一定時間が経った（かつ更新がある）」ときにバックグラウンドスレッドで保存する
+# 保存する内容は controller.freeze()（コピーオンライト）で受け取るため、UI スレッドは書き込みを待たない
+# 保存ごとの所要時間・サイズは metrics に残し、cache/snapshot_metrics.csv にも追記する
+# 従来形式の cache/cache_snapshot_*.csv は export_csv() で明示的に書き出したときだけ作る
+
+import os
+import csv
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+from atomic_writer import atomic_write, locked_append
+from snapshot_store import SnapshotInfo, TIMESTAMP_FORMAT, apply_retention, write_snapshot
+
+SNAPSHOT_DIR = "cache"
+METRICS_FILE = "snapshot_metrics.csv"
+METRICS_COLUMNS = ["name", "created", "revision", "rows", "new_rows", "bytes", "duration_sec"]
+SNAPSHOT_KEY_COLUMN = "No."
+DEFAULT_INTERVAL_SEC = int(os.environ.get("CIRCUS_SNAPSHOT_INTERVAL_SEC", "300"))
+DEFAULT_CHANGE_THRESHOLD = int(os.environ.get("CIRCUS_SNAPSHOT_CHANGE_THRESHOLD", "50"))
+METRICS_HISTORY = 100
+
+
+def _with_numbers(mapping_cache):
+    """{No.: 行} の各行に No. 列を持たせる（ensure_entry で作った空の行など）"""
+    return {
+        no: row if row.get(SNAPSHOT_KEY_COLUMN) not in (None, "") else {**row, SNAPSHOT_KEY_COLUMN: no}
+        for no, row in mapping_cache.items()
+    }
+
+
+def export_cache_snapshot_csv(mapping_cache, cache_dir=SNAPSHOT_DIR, timestamp=None):
+    """{No.: 行} を全件コピーの cache_snapshot_*.csv として書き出し、SnapshotInfo を返す（同じ時刻のファイルがあれば None）"""
+    start = time.perf_counter()
+    name = "cache_snapshot_" + (timestamp or datetime.now()).strftime(TIMESTAMP_FORMAT)
+    path = os.path.join(cache_dir, f"{name}.csv")
+    if os.path.exists(path):
+        return None
+
+    rows = _with_numbers(mapping_cache)
+    # 列は No. を先頭に、現れた順にそろえる（行によって列が違ってもよい）
+    fieldnames = list(dict.fromkeys([SNAPSHOT_KEY_COLUMN] + [col for row in rows.values() for col in row]))
+    os.makedirs(cache_dir, exist_ok=True)
+    with atomic_write(path, encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows.values())
+    return SnapshotInfo(name, len(rows), len(rows), os.path.getsize(path), time.perf_counter() - start)
+
+
+class SnapshotScheduler:
+    """MappingCacheController の更新を数え、条件を満たしたらバックグラウンドでスナップショットを保存する"""
+
+    def __init__(self, controller, cache_dir=SNAPSHOT_DIR, interval_sec=DEFAULT_INTERVAL_SEC,
+                 change_threshold=DEFAULT_CHANGE_THRESHOLD, retention=True):
+        self.controller = controller
+        self.cache_dir = cache_dir
+        self.interval_sec = interval_sec
+        self.change_threshold = change_threshold
+        self.retention = retention
+        self.metrics = deque(maxlen=METRICS_HISTORY)  # SnapshotInfo の履歴（新しいものが後ろ）
+        self.failures = 0
+        self._saved_revision = controller.revision
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    # === 起動・停止 ===
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.controller.add_change_listener(self._on_change)
+        self._thread = threading.Thread(target=self._run, name="snapshot-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True, timeout=10):
+        """スレッドを止める。flush=True なら未保存の更新を最後に保存する"""
+        if self._thread is None:
+            return
+        self.controller.remove_change_listener(self._on_change)
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        if flush and self.pending_changes:
+            self.snapshot_now()
+
+    @property
+    def pending_changes(self):
+        return self.controller.revision - self._saved_revision
+
+    # === 保存 ===
+    def _on_change(self, revision):
+        # 更新したスレッド（UI）から呼ばれるので、ここでは起こすだけにする
+        if revision - self._saved_revision >= self.change_threshold:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval_sec if self.interval_sec > 0 else None)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            if self.pending_changes:
+                self.snapshot_now()
+
+    def snapshot_now(self):
+        """今の内容を差分スナップショットとして保存し、SnapshotInfo を返す（更新が無ければ None）
+
+        前回と同じ内容の行は書かないため、保存量・時間は変更された行の数に比例する。
+        """
+        with self._write_lock:
+            mapping_cache, revision = self.controller.freeze()
+            if revision == self._saved_revision:
+                return None
+            try:
+                info = write_snapshot(_with_numbers(mapping_cache), self.cache_dir)
+            except Exception as e:
+                self.failures += 1
+                print(f"[snapshot] 自動保存エラー: {e}")
+                return None
+            self._saved_revision = revision
+            self.metrics.append(info)
+            self._record_metrics(info, revision)
+            if self.retention:
+                try:
+                    apply_retention(self.cache_dir)
+                except Exception as e:
+                    print(f"[snapshot] 保持ポリシー適用エラー: {e}")
+            return info
+
+    def export_csv(self):
+        """今の内容を従来形式の cache_snapshot_*.csv（全件コピー）として書き出す"""
+        mapping_cache, _ = self.controller.freeze()
+        info = export_cache_snapshot_csv(mapping_cache, self.cache_dir)
+        if info is not None:
+            print(f"[snapshot] CSV 書き出し: {info}")
+        return info
+
+    def _record_metrics(self, info, revision):
+        path = os.path.join(self.cache_dir, METRICS_FILE)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with locked_append(path, encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if f.tell() == 0:
+                    writer.writerow(METRICS_COLUMNS)
+                writer.writerow([info.name, datetime.now().isoformat(timespec="seconds"), revision,
+                                 info.rows, info.new_rows, info.bytes_written, f"{info.duration_sec:.4f}"])
+        except OSError as e:
+            print(f"[snapshot] メトリクス記録エラー: {e}")
+
+    def stats(self):
+        """保存回数・合計サイズ・平均/最大所要時間・直近の保存を返す"""
+        durations = [info.duration_sec for info in self.metrics]
+        return {
+            "snapshots": len(self.metrics),
+            "failures": self.failures,
+            "pending_changes": self.pending_changes,
+            "total_bytes": sum(info.bytes_written for info in self.metrics),
+            "new_rows": sum(info.new_rows for info in self.metrics),
+            "avg_duration_sec": sum(durations) / len(durations) if durations else 0.0,
+            "max_duration_sec": max(durations, default=0.0),
+            "last": self.metrics[-1] if self.metrics else None,
+        }
@@ -0,0 +1,303 @@
+# === このファイルの責務（GPT用構造補助） ===
+# snapshot_store.py：
+# マッピングキャッシュのスナップショットを「差分のみ」で保存・復元する
+#   cache/manifests/snapshot_YYYYmmdd_HHMMSS.json … 各行の (No., 行ハッシュ, パック番号) の一覧
+#   cache/objects/snapshot_YYYYmmdd_HHMMSS.pack.jsonl … そのスナップショットで新しく現れた行だけ
+# 行は内容のハッシュで管理するため、前回と同じ行は二度と書かない（保存量・時間は変更量に比例する）
+# 保持ポリシー（直近 N 時間・N 日を 1 件ずつ残す）で古いスナップショットと不要なパックを削除する
+# 削除するときは書き込み時のロックファイル（従来の CSV ではサイドカーも）を一緒に消す
+
+import os
+import re
+import json
+import glob
+import time
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+from atomic_writer import atomic_write, LOCK_SUFFIX
+from binary_snapshot import SIDECAR_SUFFIX
+
+SNAPSHOT_DIR = "cache"
+MANIFEST_DIR = "manifests"
+OBJECT_DIR = "objects"
+SNAPSHOT_KEY_COLUMN = "No."
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+KEEP_HOURLY = 24
+KEEP_DAILY = 14
+KEEP_LATEST = 2  # 差分監視が比較できるよう、時間帯に関係なく最新の N 件は残す
+# 差分スナップショットと、従来の全件コピー（cache_snapshot_*.csv）の両方から時刻を読み取る
+_TIMESTAMP_PATTERN = re.compile(r"(\d{8}_\d{6})")
+
+
+class SnapshotInfo:
+    """スナップショット 1 件の書き込み結果"""
+
+    def __init__(self, name, rows, new_rows, bytes_written, duration_sec):
+        self.name = name
+        self.rows = rows
+        self.new_rows = new_rows            # 新しく保存した（前回に無かった内容の）行数
+        self.bytes_written = bytes_written
+        self.duration_sec = duration_sec
+
+    def __repr__(self):
+        return (f"SnapshotInfo({self.name}: {self.rows} 行 / 新規 {self.new_rows} 行 / "
+                f"{self.bytes_written} バイト / {self.duration_sec:.3f} 秒)")
+
+
+def _manifest_dir(cache_dir):
+    return os.path.join(cache_dir, MANIFEST_DIR)
+
+
+def _object_dir(cache_dir):
+    return os.path.join(cache_dir, OBJECT_DIR)
+
+
+def _manifest_path(cache_dir, name):
+    return os.path.join(_manifest_dir(cache_dir), f"{name}.json")
+
+
+def _pack_path(cache_dir, pack):
+    return os.path.join(_object_dir(cache_dir), f"{pack}.pack.jsonl")
+
+
+def _row_hash(row):
+    payload = json.dumps(row, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _normalize_entries(entries):
+    """DataFrame / {No.: 行} / [行, ...] を [(No., 行), ...] と列順にそろえる（欠損値は持たない）"""
+    if isinstance(entries, pd.DataFrame):
+        columns = list(entries.columns)
+        records = entries.to_dict("records")
+        items = [(record.get(SNAPSHOT_KEY_COLUMN, f"auto_{i}"), record) for i, record in enumerate(records)]
+    elif isinstance(entries, dict):
+        items = list(entries.items())
+        columns = None
+    else:
+        items = [(record.get(SNAPSHOT_KEY_COLUMN, f"auto_{i}"), record) for i, record in enumerate(entries)]
+        columns = None
+    normalized = []
+    for key, row in items:
+        row = {col: str(value) for col, value in row.items() if not (value is None or (isinstance(value, float) and pd.isna(value)))}
+        normalized.append((str(key), row))
+    if columns is None:
+        columns = list(dict.fromkeys(col for _, row in normalized for col in row))
+    return normalized, columns
+
+
+def list_snapshots(cache_dir=SNAPSHOT_DIR):
+    """差分スナップショットの名前を古い順に返す"""
+    paths = glob.glob(os.path.join(_manifest_dir(cache_dir), "snapshot_*.json"))
+    return sorted(os.path.splitext(os.path.basename(path))[0] for path in paths)
+
+
+def load_manifest(name, cache_dir=SNAPSHOT_DIR):
+    with open(_manifest_path(cache_dir, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _unique_name(name, names):
+    """同じ秒のスナップショットが既にあれば _001, _002 ... を付ける（名前順 = 作成順を保つ）"""
+    existing = set(names)
+    candidate = name
+    counter = 0
+    while candidate in existing:
+        counter += 1
+        candidate = f"{name}_{counter:03d}"
+    return candidate
+
+
+def write_snapshot(entries, cache_dir=SNAPSHOT_DIR, timestamp=None):
+    """entries をスナップショットとして保存し、SnapshotInfo を返す
+
+    前回のスナップショットに同じ内容の行があれば、その行は書かずに参照だけを記録する。
+    """
+    start = time.perf_counter()
+    rows, columns = _normalize_entries(entries)
+    names = list_snapshots(cache_dir)
+    name = _unique_name("snapshot_" + (timestamp or datetime.now()).strftime(TIMESTAMP_FORMAT), names)
+
+    # 前回のスナップショットが参照している行ハッシュ -> パック
+    known = {}
+    previous = None
+    if names:
+        previous = load_manifest(names[-1], cache_dir)
+        for _, row_hash, pack_index in previous["rows"]:
+            known[row_hash] = previous["packs"][pack_index]
+
+    packs = []
+    pack_indexes = {}
+    manifest_rows = []
+    new_lines = []
+    for key, row in rows:
+        row_hash = _row_hash(row)
+        pack = known.get(row_hash)
+        if pack is None:
+            pack = known[row_hash] = name
+            new_lines.append(json.dumps({"h": row_hash, "r": row}, ensure_ascii=False))
+        if pack not in pack_indexes:
+            pack_indexes[pack] = len(packs)
+            packs.append(pack)
+        manifest_rows.append([key, row_hash, pack_indexes[pack]])
+
+    if previous is not None and not new_lines and previous["columns"] == columns and \
+            [row[:2] for row in previous["rows"]] == [row[:2] for row in manifest_rows]:
+        # 前回から何も変わっていなければ新しいスナップショットは作らない
+        info = SnapshotInfo(previous["name"], len(rows), 0, 0, time.perf_counter() - start)
+        print(f"[snapshot] 変更なし: {info}")
+        return info
+
+    os.makedirs(_manifest_dir(cache_dir), exist_ok=True)
+    os.makedirs(_object_dir(cache_dir), exist_ok=True)
+    bytes_written = 0
+    if new_lines:
+        pack_data = "\n".join(new_lines) + "\n"
+        with atomic_write(_pack_path(cache_dir, name), encoding="utf-8", newline="\n") as f:
+            f.write(pack_data)
+        bytes_written += len(pack_data.encode("utf-8"))
+    manifest = {
+        "name": name,
+        "created": datetime.now().isoformat(),
+        "columns": columns,
+        "packs": packs,
+        "rows": manifest_rows,
+    }
+    manifest_data = json.dumps(manifest, ensure_ascii=False)
+    with atomic_write(_manifest_path(cache_dir, name), encoding="utf-8", newline="\n") as f:
+        f.write(manifest_data)
+    bytes_written += len(manifest_data.encode("utf-8"))
+
+    info = SnapshotInfo(name, len(rows), len(new_lines), bytes_written, time.perf_counter() - start)
+    print(f"[snapshot] {info}")
+    return info
+
+
+def _read_packs(cache_dir, packs, wanted):
+    blobs = {}
+    for pack in packs:
+        with open(_pack_path(cache_dir, pack), encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["h"] in wanted:
+                    blobs[record["h"]] = record["r"]
+    return blobs
+
+
+def restore_snapshot(name=None, cache_dir=SNAPSHOT_DIR):
+    """スナップショットを {No.: 行} として復元する（name 省略時は最新）"""
+    if name is None:
+        names = list_snapshots(cache_dir)
+        if not names:
+            raise FileNotFoundError(f"スナップショットがありません: {_manifest_dir(cache_dir)}")
+        name = names[-1]
+    manifest = load_manifest(name, cache_dir)
+    blobs = _read_packs(cache_dir, manifest["packs"], {row_hash for _, row_hash, _ in manifest["rows"]})
+    return {key: dict(blobs[row_hash]) for key, row_hash, _ in manifest["rows"]}
+
+
+def load_rows(name, keys, cache_dir=SNAPSHOT_DIR):
+    """スナップショット name のうち、keys に含まれる No. の行だけを {No.: 行} で返す"""
+    manifest = load_manifest(name, cache_dir)
+    keys = set(keys)
+    wanted = {key: (row_hash, pack_index) for key, row_hash, pack_index in manifest["rows"] if key in keys}
+    packs = sorted({manifest["packs"][pack_index] for _, pack_index in wanted.values()})
+    blobs = _read_packs(cache_dir, packs, {row_hash for row_hash, _ in wanted.values()})
+    return {key: dict(blobs[row_hash]) for key, (row_hash, _) in wanted.items()}
+
+
+def restore_snapshot_frame(name=None, cache_dir=SNAPSHOT_DIR):
+    """スナップショットを DataFrame（保存時の列順）として復元する"""
+    if name is None:
+        names = list_snapshots(cache_dir)
+        name = names[-1] if names else None
+    entries = restore_snapshot(name, cache_dir)
+    columns = load_manifest(name, cache_dir)["columns"]
+    return pd.DataFrame(list(entries.values()), columns=columns)
+
+
+def _snapshot_time(name):
+    match = _TIMESTAMP_PATTERN.search(name)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def select_retained(names, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY, keep_latest=KEEP_LATEST):
+    """保持ポリシーで残す名前の集合を返す（最新 N 件と、各時間・各日の最新を新しい順にそれぞれ N 件）"""
+    dated = sorted(((_snapshot_time(name), name) for name in names if _snapshot_time(name)), reverse=True)
+    keep = {name for name in names if _snapshot_time(name) is None}  # 時刻の読めないファイルは消さない
+    keep.update(name for _, name in dated[:max(keep_latest, 1)])
+    for bucket_format, limit in (("%Y%m%d%H", keep_hourly), ("%Y%m%d", keep_daily)):
+        buckets = set()
+        for stamp, name in dated:
+            bucket = stamp.strftime(bucket_format)
+            if bucket in buckets:
+                continue
+            if len(buckets) >= limit:
+                break
+            buckets.add(bucket)
+            keep.add(name)
+    return keep
+
+
+def _remove_file(path, removed):
+    """path と、その書き込み時に作られたロックファイルを削除する（無ければ何もしない）"""
+    for target in (path, path + LOCK_SUFFIX):
+        try:
+            os.remove(target)
+        except FileNotFoundError:
+            continue
+        if target == path:
+            removed.append(path)
+
+
+def apply_retention(cache_dir=SNAPSHOT_DIR, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY, keep_latest=KEEP_LATEST):
+    """保持ポリシーに外れたスナップショット（差分・従来の CSV）と、参照されなくなったパックを削除する
+
+    削除したファイルのパスを返す。
+    """
+    removed = []
+    names = list_snapshots(cache_dir)
+    keep = select_retained(names, keep_hourly, keep_daily, keep_latest)
+    for name in names:
+        if name not in keep:
+            _remove_file(_manifest_path(cache_dir, name), removed)
+
+    legacy = sorted(glob.glob(os.path.join(cache_dir, "cache_snapshot_*.csv")))
+    legacy_keep = select_retained([os.path.basename(path) for path in legacy], keep_hourly, keep_daily, keep_latest)
+    for path in legacy:
+        if os.path.basename(path) not in legacy_keep:
+            _remove_file(path, removed)
+            _remove_file(path + SIDECAR_SUFFIX, removed)
+
+    # 残ったスナップショットから参照されていないパックを削除する
+    referenced = set()
+    for name in list_snapshots(cache_dir):
+        referenced.update(load_manifest(name, cache_dir)["packs"])
+    for path in glob.glob(os.path.join(_object_dir(cache_dir), "*.pack.jsonl")):
+        if os.path.basename(path)[:-len(".pack.jsonl")] not in referenced:
+            _remove_file(path, removed)
+
+    # 以前の版が残した、対象ファイルの無いロックファイル・サイドカーも片付ける
+    for pattern in (os.path.join(_manifest_dir(cache_dir), "*" + LOCK_SUFFIX),
+                    os.path.join(_object_dir(cache_dir), "*" + LOCK_SUFFIX),
+                    os.path.join(cache_dir, "cache_snapshot_*.csv" + LOCK_SUFFIX),
+                    os.path.join(cache_dir, "cache_snapshot_*.csv" + SIDECAR_SUFFIX + LOCK_SUFFIX)):
+        for path in glob.glob(pattern):
+            if not os.path.exists(path[:-len(LOCK_SUFFIX)]):
+                _remove_file(path, removed)
+    for path in glob.glob(os.path.join(cache_dir, "cache_snapshot_*.csv" + SIDECAR_SUFFIX)):
+        if not os.path.exists(path[:-len(SIDECAR_SUFFIX)]):
+            _remove_file(path, removed)
+    if removed:
+        print(f"[snapshot] 保持ポリシーにより {len(removed)} 件のファイルを削除しました")
+    return removed
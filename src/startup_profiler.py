@@ -0,0 +1,112 @@
+# === このファイルの責務（GPT用構造補助） ===
+# startup_profiler.py：
+# 起動時間の計測（circus_suport_tool.py --profile-startup で有効）
+#   ・モジュールごとの import 時間（初回 import のみ。下位モジュールを含む時間と、自身だけの時間）
+#   ・区間の記録（mark）… 最初のウインドウ表示までなど
+#   ・タブごとの構築時間
+# 有効にしていないときは何もしない（import 関数も置き換えない）
+# import はバックグラウンドスレッド（先読みなど）からも呼ばれるため、入れ子の記録はスレッドごとに持つ
+
+import sys
+import time
+import builtins
+import threading
+
+STARTUP_BUDGET_SEC = 2.0  # 起動（最初のウインドウ表示まで）の目標時間
+REPORT_TOP_MODULES = 20
+FIRST_WINDOW = "最初のウインドウ表示"
+
+_enabled = False
+_start = time.perf_counter()  # このモジュールを import した時刻を起点にする
+_original_import = None
+_import_times = {}   # モジュール名 -> [下位を含む秒数, 自身だけの秒数]
+_local = threading.local()  # stack: このスレッドで計測中の import ごとの「下位 import に使った秒数」
+_lock = threading.Lock()    # _import_times・_marks・_tab_times の更新と読み出し
+_marks = []          # (ラベル, 起動からの秒数)
+_tab_times = []      # (タブ名, 秒数)
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    """import 時間の計測を始める（以後に初めて import されるモジュールが対象）"""
+    global _enabled, _original_import
+    if _enabled:
+        return
+    _enabled = True
+    _original_import = builtins.__import__
+    builtins.__import__ = _timed_import
+
+
+def disable():
+    global _enabled
+    if _enabled and _original_import is not None:
+        builtins.__import__ = _original_import
+    _enabled = False
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # 相対 import や読み込み済みのモジュールは計測しない
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with _lock:
+            _import_times.setdefault(name, [elapsed, elapsed - children])
+
+
+def mark(label):
+    """起動からの経過時間をラベル付きで記録する"""
+    if _enabled:
+        with _lock:
+            _marks.append((label, time.perf_counter() - _start))
+
+
+def record_tab(title, seconds):
+    """タブの構築時間を記録し、計測中ならその場で表示する"""
+    if _enabled:
+        with _lock:
+            _tab_times.append((title, seconds))
+        print(f"[startup] タブ構築: {title} {seconds * 1000:.1f} ms")
+
+
+def report_lines(budget_sec=STARTUP_BUDGET_SEC, top=REPORT_TOP_MODULES):
+    with _lock:
+        marks, import_times, tab_times = list(_marks), dict(_import_times), list(_tab_times)
+    lines = ["[startup] ===== 起動時間レポート ====="]
+    for label, seconds in marks:
+        lines.append(f"[startup] {label}: {seconds:.3f} 秒")
+    first_window = next((seconds for label, seconds in marks if label == FIRST_WINDOW), None)
+    if first_window is not None and budget_sec:
+        verdict = "OK" if first_window <= budget_sec else "目標超過"
+        lines.append(f"[startup] 目標 {budget_sec:.2f} 秒に対して {first_window:.3f} 秒（{verdict}）")
+
+    if import_times:
+        lines.append(f"[startup] import 時間（上位 {top} 件、下位モジュールを含む / 自身のみ）")
+        ranked = sorted(import_times.items(), key=lambda item: -item[1][0])[:top]
+        for name, (inclusive, own) in ranked:
+            lines.append(f"[startup]   {name:<32} {inclusive * 1000:8.1f} ms {own * 1000:8.1f} ms")
+    if tab_times:
+        lines.append("[startup] タブ構築時間")
+        for title, seconds in tab_times:
+            lines.append(f"[startup]   {title:<24} {seconds * 1000:8.1f} ms")
+    return lines
+
+
+def print_report(budget_sec=STARTUP_BUDGET_SEC):
+    if _enabled:
+        for line in report_lines(budget_sec):
+            print(line)
+